@@ -0,0 +1,111 @@
+"""
+Generators of synthetic state machines for the benchmarks.
+
+Every generator returns a :class:`Machine` made of freshly created :class:`State` subclasses with no-op transitions and
+verifications. The machines are not reusable: registering a collection renames its states, so a new machine has to be
+generated for every run.
+"""
+import random
+from collections import namedtuple
+
+from state_machine_crawler import StateMachineCrawler, StateCollection, State, transition
+
+Machine = namedtuple("Machine", ["initial", "states", "collections", "target"])
+""" A synthetic state machine: an *initial* state, the *states* and *collections* to register and the *target* state
+that is the farthest one from the initial state """
+
+
+class _Synthetic(State):
+
+    def verify(self):
+        pass
+
+
+def _noop(state):
+    pass
+
+
+def _create_state(module, name, **transitions):
+    """ Creates a state with a no-op transition per keyword argument. The values are dicts of @transition arguments """
+    attrs = {"__module__": module}
+    for attr_name, kwargs in transitions.iteritems():
+        attrs[attr_name] = transition(**kwargs)(_noop)
+    return type(name, (_Synthetic,), attrs)
+
+
+def _entry():
+    return {"source_state": StateMachineCrawler.EntryPoint}
+
+
+def chain(size):
+    """ A chain of @size states each of which can only be reached from the previous one """
+    states = [_create_state("chain", "Step0", enter=_entry())]
+    for index in xrange(1, size):
+        states.append(_create_state("chain", "Step%d" % index, forward={"source_state": states[-1]}))
+    return Machine(states[0], states, [], states[-1])
+
+
+def grid(width, height):
+    """ A @width x @height grid of states with transitions to the right, downwards and back to the left """
+    rows = []
+    for y in xrange(height):
+        row = []
+        for x in xrange(width):
+            transitions = {}
+            if x == 0 and y == 0:
+                transitions["enter"] = _entry()
+            if x:
+                transitions["from_left"] = {"source_state": row[x - 1]}
+                transitions["to_left"] = {"target_state": row[x - 1]}
+            if y:
+                transitions["from_above"] = {"source_state": rows[y - 1][x]}
+            row.append(_create_state("grid", "Cell%dx%d" % (x, y), **transitions))
+        rows.append(row)
+    states = [state for cells in rows for state in cells]
+    return Machine(states[0], states, [], states[-1])
+
+
+def random_dag(size, degree, seed=0):
+    """ A directed acyclic graph of @size states each of which can be reached from up to @degree random previous
+    ones """
+    rand = random.Random(seed)
+    states = [_create_state("dag", "Node0", enter=_entry())]
+    for index in xrange(1, size):
+        sources = rand.sample(states, min(degree, len(states)))
+        transitions = dict(("from_%d" % number, {"source_state": source}) for number, source in enumerate(sources))
+        states.append(_create_state("dag", "Node%d" % index, **transitions))
+    return Machine(states[0], states, [], states[-1])
+
+
+def dense(size):
+    """ @size states with transitions between every pair of them in both directions """
+    states = [_create_state("dense", "Node0", enter=_entry())]
+    for index in xrange(1, size):
+        transitions = {}
+        for number, other in enumerate(states):
+            transitions["from_%d" % number] = {"source_state": other}
+            transitions["to_%d" % number] = {"target_state": other}
+        states.append(_create_state("dense", "Node%d" % index, **transitions))
+    return Machine(states[0], states, [], states[-1])
+
+
+def nested_collections(depth, width):
+    """ @depth collections nested in each other, each one holding a chain of @width states that continues the chain of
+    the enclosing collection """
+    collections = []
+    initial = previous = None
+    for level in xrange(depth):
+        name = "level%d" % level
+        collection = StateCollection(name)
+        for index in xrange(width):
+            if previous is None:
+                transitions = {"enter": _entry()}
+            else:
+                transitions = {"forward": {"source_state": previous}}
+            previous = _create_state(name, "Step%d" % index, **transitions)
+            initial = initial or previous
+            collection.register_state(previous)
+        if collections:
+            collections[-1].register_collection(collection)
+        collections.append(collection)
+    return Machine(initial, [], collections[:1], previous)
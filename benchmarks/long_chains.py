@@ -0,0 +1,45 @@
+#!/usr/bin/python
+"""
+Times the graph walks on long chain-like graphs (e.g. wizard flows) that used to exceed the recursion limit.
+
+    python benchmarks/long_chains.py [nodes] [states]
+"""
+import sys
+import time
+
+from run import create_crawler
+from generators import chain
+
+from state_machine_crawler.state_machine_crawler import _create_state_map_with_exclusions, _get_missing_nodes, \
+    _dfs, _get_reachable_nodes, _find_shortest_path
+
+
+def _timed(name, function, *args):
+    start = time.time()
+    result = function(*args)
+    print("%-40s %8.3fs" % (name, time.time() - start))
+    return result
+
+
+def create_chain_graph(size):
+    graph = dict((node, {node + 1, 0}) for node in xrange(size - 1))
+    graph[size - 1] = {0}
+    return graph
+
+
+def main(nodes=100000, states=100000):
+    graph = create_chain_graph(nodes)
+    sub_graph = _timed("exclusions (%d nodes)" % nodes, _create_state_map_with_exclusions, graph, 0,
+                       [nodes / 2])
+    _timed("missing nodes (%d nodes)" % nodes, _get_missing_nodes, graph, sub_graph, 0)
+    _timed("dfs (%d nodes)" % nodes, _dfs, graph, 0)
+    _timed("bfs (%d nodes)" % nodes, _get_reachable_nodes, graph, 0)
+    _timed("shortest path (%d nodes)" % nodes, _find_shortest_path, graph, 0, nodes - 1)
+
+    machine = chain(states)
+    scm = _timed("registration (%d states)" % states, create_crawler, machine)
+    _timed("move (%d states)" % states, scm.move, machine.target)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+"""
+Times the main operations of the crawler on synthetic state machines and stores the results as JSON so that the runs
+made on different commits can be compared.
+
+    python benchmarks/run.py --output before.json
+    ...
+    python benchmarks/run.py --output after.json --compare before.json
+
+Every operation is repeated on a freshly generated machine and the best time is reported.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from collections import OrderedDict
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from state_machine_crawler import StateMachineCrawler  # noqa
+from state_machine_crawler.serializers.text import Serializer as TextSerializer  # noqa
+from state_machine_crawler.serializers.dot import Serializer as DotSerializer  # noqa
+from state_machine_crawler.serializers.svg import Serializer as SvgSerializer  # noqa
+
+import generators  # noqa
+
+SCENARIOS = OrderedDict([
+    ("chain", lambda scale: generators.chain(1000 * scale)),
+    ("grid", lambda scale: generators.grid(20 * scale, 20)),
+    ("random_dag", lambda scale: generators.random_dag(500 * scale, 3)),
+    ("dense", lambda scale: generators.dense(30 * scale)),
+    ("nested_collections", lambda scale: generators.nested_collections(10 * scale, 20)),
+])
+
+SERIALIZERS = OrderedDict([
+    ("text", TextSerializer),
+    ("dot", DotSerializer),
+])
+
+
+class _NoopSystem(object):
+    pass
+
+
+def create_crawler(machine):
+    scm = StateMachineCrawler(_NoopSystem(), machine.initial)
+    with scm.registering():
+        for state in machine.states:
+            scm.register_state(state)
+        for collection in machine.collections:
+            scm.register_collection(collection)
+    return scm
+
+
+def _serialize(serializer, scm):
+    return repr(serializer(scm))
+
+
+def _serialize_svg(scm):
+    # the layouts are cached by the structure of the graph, the machines of all the repeats have the same one
+    SvgSerializer._layouts.clear()
+    return _serialize(SvgSerializer, scm)
+
+
+def _stages(machine):
+    """ Yields (name, callable) pairs of the operations to time. Each one gets the crawler created by the previous
+    stage """
+    yield "registration", lambda scm: create_crawler(machine)
+    yield "reload_graphs", lambda scm: scm._reload_graphs()
+    yield "move", lambda scm: scm.move(machine.target)
+    yield "plan_states", lambda scm: scm.plan_states()
+    yield "plan_transitions", lambda scm: scm.plan_transitions()
+    yield "verify_all_states_full", lambda scm: scm.verify_all_states(full=True)
+    yield "as_graph", lambda scm: scm.as_graph()
+    for name, serializer in SERIALIZERS.iteritems():
+        yield "serialize_" + name, lambda scm, serializer=serializer: _serialize(serializer, scm)
+    # Graphviz lays out the graph only in the first one, the second one recolors the cached layout
+    yield "serialize_svg", _serialize_svg
+    yield "serialize_svg_cached", lambda scm: _serialize(SvgSerializer, scm)
+
+
+def run_scenario(create_machine, repeat, skip=()):
+    """ Returns the best timings of the stages along with the size of the machine. A stage that fails once is not
+    timed anymore, its timing is None and the error is reported """
+    timings = OrderedDict()
+    errors = {}
+    for _ in xrange(repeat):
+        machine = create_machine()
+        scm = None
+        for name, stage in _stages(machine):
+            if name in skip or name in errors:
+                continue
+            start = time.time()
+            try:
+                result = stage(scm)
+            except Exception, e:
+                timings[name] = None
+                errors[name] = "%s: %s" % (type(e).__name__, e)
+                continue
+            duration = time.time() - start
+            if name == "registration":
+                scm = result
+            timings[name] = min(timings.get(name, duration), duration)
+    info = {
+        "states": len(scm._state_graph),
+        "transitions": sum(len(targets) for _, targets in scm._state_graph.iteritems()),
+        "timings": timings
+    }
+    if errors:
+        info["errors"] = errors
+    return info
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """ Prints the ratios of the timings of the @results to the ones of the @baseline """
+    for scenario, info in results["scenarios"].iteritems():
+        base_info = baseline["scenarios"].get(scenario)
+        if not base_info:
+            continue
+        print(scenario)
+        for stage, duration in info["timings"].iteritems():
+            base_duration = base_info["timings"].get(stage)
+            if not duration or not base_duration:
+                continue
+            print("    %-25s %9.4fs -> %9.4fs  x%.2f" % (stage, base_duration, duration, duration / base_duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the state machine crawler on synthetic state machines")
+    parser.add_argument("--scale", type=int, default=1, help="Multiplies the sizes of the generated machines")
+    parser.add_argument("--repeat", type=int, default=3, help="How many times each operation is timed")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS.keys(),
+                        help="Run only the given scenarios. May be repeated")
+    parser.add_argument("--skip", action="append", default=[],
+                        help="Do not time the given stage, e.g. 'serialize_svg' and 'serialize_svg_cached' which are "
+                             "slow on big machines. May be repeated")
+    parser.add_argument("--output", help="A file to store the JSON results in. Printed to stdout if omitted")
+    parser.add_argument("--compare", help="A JSON file of a previous run to compare the results with")
+    args = parser.parse_args()
+
+    results = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "scenarios": OrderedDict()
+    }
+    for name in args.scenario or SCENARIOS:
+        results["scenarios"][name] = run_scenario(lambda: SCENARIOS[name](args.scale), args.repeat, args.skip)
+
+    if args.output:
+        with open(args.output, "w") as fil:
+            json.dump(results, fil, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as fil:
+            compare(results, json.load(fil))
+
+
+if __name__ == "__main__":
+    main()
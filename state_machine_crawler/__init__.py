@@ -1,10 +1,19 @@
-from .state_machine_crawler import StateMachineCrawler
+from .state_machine_crawler import StateMachineCrawler, CoveragePlan
 from .blocks import State, transition
 from .errors import DeclarationError, TransitionError, UnreachableStateError, NonExistentStateError, MultipleStatesError
 from .webview import WebView
+from .parallel import ParallelCrawler
 from .cli import cli
 from .autodiscover import entry_point
 from .collection import StateCollection
+from .timings import Timings
+from .snapshots import Snapshots
+from .journal import Journal
+from .events import EventBus, JsonLinesWriter, RingBuffer
+from .verification import Always, FinalTarget, EveryNthHop, FirstVisit
 
 __all__ = ["transition", "State", "StateMachineCrawler", "DeclarationError", "TransitionError", "WebView", "cli",
-           "UnreachableStateError", "entry_point", "NonExistentStateError", "MultipleStatesError", "StateCollection"]
+           "UnreachableStateError", "entry_point", "NonExistentStateError", "MultipleStatesError", "StateCollection",
+           "CoveragePlan", "ParallelCrawler",
+           "Timings", "Always", "FinalTarget", "EveryNthHop", "FirstVisit",
+           "Snapshots", "Journal", "EventBus", "JsonLinesWriter", "RingBuffer"]
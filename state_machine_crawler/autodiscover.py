@@ -3,6 +3,7 @@ import sys
 import os
 
 from .cli import cli
+from .state_machine_crawler import StateMachineCrawler
 
 
 STATE_MACHINE_CONFIG = "state_machine_crawler.json"
@@ -48,6 +49,11 @@ def entry_point():
     config file) or an absolute file path leading to the directory that contains Python code for the particular state
     machine.
 
+    The graph of the states can be cached between the runs in a file defined via an optional 'graph_cache' field -
+    either a relative (with respect to parent directory of the config file) or an absolute file path, see
+    :meth:`StateMachineCrawler.save_graph_cache <state_machine_crawler.StateMachineCrawler.save_graph_cache>`. The
+    cache is disabled if the field is omitted.
+
     An example of a valid JSON config file:
 
     .. code:: json
@@ -88,6 +94,10 @@ def entry_point():
     if not state_machine_instance:
         raise StateMachineDiscoveryError("StateMachine's 'instance' is not defined")
 
+    graph_cache = config.get("graph_cache")
+    if graph_cache:
+        StateMachineCrawler.graph_cache_path = os.path.join(os.path.dirname(config_file_path), graph_cache)
+
     try:
         scm = _import(state_machine_instance)
     except ImportError:
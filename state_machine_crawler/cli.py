@@ -5,6 +5,9 @@ import sys
 
 from .state_machine_crawler import TransitionError
 from .webview import WebView
+from .timings import Timings
+from .journal import Journal
+from .events import EventBus, JsonLinesWriter
 from .serializers.svg import Serializer as SvgSerializer
 from .serializers.text import Serializer as TextSerializer
 
@@ -46,6 +49,8 @@ def cli(scm):
         Exercise not only all states but also all transitions
     *-w, --with-webview*
         Indicates if webview should be started
+    *--webview-port*
+        A port for the webview to listen on
     *-c, --current-state*
         If it is known that the system is in specific state - it is possible to specify it and avoid extra transitions
     *-d, --debug*
@@ -56,6 +61,21 @@ def cli(scm):
         In the end of transition operations stores state machine's info in a text file @ desired location
     *--svg*
         In the end of transition operations stores state machine's info as an svg image @ desired location
+    *--timings*
+        A JSON file with durations of transitions and verifications. It is loaded before and updated after the run
+    *--measured-costs*
+        Plan the paths based on the durations from the *--timings* file instead of static transition costs
+    *--path-table*
+        Precompute the cheapest paths between all pairs of states. Speeds up long *-p* chains and *-a*, *-f* runs on
+        big state machines at the cost of memory
+    *--journal*
+        A file to write a record about every transition and verification to. The file is overwritten unless
+        *--resume* is given
+    *--events*
+        A file to append a JSON line about every step, failure and plan of the crawler to
+    *--resume*
+        Restore the progress of an interrupted run from the *--journal* file and continue with the remaining states and
+        transitions only
 
     NOTE: *-t*, *-a*, *-f*, *-s* and *-p* arguments are mutually exclusive
 
@@ -87,6 +107,7 @@ def cli(scm):
     group.add_argument("-f", "--full", action="store_true",
                        help="Exercise not only all states but also all transitions")
     parser.add_argument("-w", "--with-webview", action="store_true", help="Indicates if webview should be started")
+    parser.add_argument("--webview-port", type=int, default=WebView.PORT, help="A port for the webview to listen on")
     parser.add_argument("-c", "--current-state", type=scm._existing_state,
                         help="If it is known that the system is in specific state - it is possible to specify it and"
                         " avoid extra transitions")
@@ -100,8 +121,26 @@ def cli(scm):
     parser.add_argument("--svg", type=path_in_existing_directory,
                         help="In the end of transition operations stores state machine's info as an svg image "
                              "@ desired location")
+    parser.add_argument("--timings", type=path_in_existing_directory,
+                        help="A JSON file with durations of transitions and verifications. It is loaded before and "
+                             "updated after the run")
+    parser.add_argument("--measured-costs", action="store_true",
+                        help="Plan the paths based on the durations from the '--timings' file instead of static "
+                             "transition costs")
+    parser.add_argument("--path-table", action="store_true",
+                        help="Precompute the cheapest paths between all pairs of states")
+    parser.add_argument("--journal", type=path_in_existing_directory,
+                        help="A file to write a record about every transition and verification to")
+    parser.add_argument("--events", type=path_in_existing_directory,
+                        help="A file to append a JSON line about every step, failure and plan of the crawler to")
+    parser.add_argument("--resume", action="store_true",
+                        help="Restore the progress of an interrupted run from the '--journal' file and continue with "
+                             "the remaining states and transitions only")
     args = parser.parse_args()
 
+    if args.resume and not args.journal:
+        parser.error("--resume requires --journal")
+
     if not args.without_flag:
         if os.path.exists(FLAG_FILE):
             with open(FLAG_FILE) as fil:
@@ -113,7 +152,26 @@ def cli(scm):
     if args.debug:
         scm.log.make_debug()
 
-    state_monitor = WebView(scm)
+    if args.timings and os.path.exists(args.timings):
+        scm.timings = Timings.load(args.timings)
+
+    if args.measured_costs:
+        scm.use_measured_costs()
+
+    if args.path_table:
+        scm.use_path_table()
+
+    if args.resume and os.path.exists(args.journal):
+        scm.resume(args.journal)
+
+    if args.journal:
+        scm.journal = Journal(args.journal, append=args.resume)
+
+    if args.events:
+        scm.events = EventBus()
+        scm.events.subscribe(JsonLinesWriter(args.events))
+
+    state_monitor = WebView(scm, port=args.webview_port)
 
     def _stop():
         time.sleep(0.5)  # to make sure that the monitor reflects the final state of the system
@@ -151,6 +209,17 @@ def cli(scm):
         with open(FLAG_FILE, "w") as fil:
             fil.write(scm._current_state.full_name)
 
+    if args.timings:
+        scm.timings.save(args.timings)
+
+    scm.save_graph_cache()
+
+    if args.journal:
+        scm.journal.close()
+
+    if args.events:
+        scm.events.close()
+
     if args.text:
         with open(args.text, "w") as fil:
             fil.write(repr(TextSerializer(scm)))
@@ -0,0 +1,125 @@
+import json
+import time
+import threading
+from Queue import Queue
+from collections import deque
+
+
+class EventBus(object):
+    """ Delivers structured events about the progress of the crawler to the subscribers.
+
+    An event is a dict with an *event* name, a *time* stamp and the fields specific to the event:
+
+    - *step started*: source, target, restore (True if the target is restored from a snapshot) and final (True if it is
+      the last step of a move)
+    - *transition ok*, *verification ok*: source, target, restore and duration in seconds
+    - *transition failed*, *verification failed*: the same plus an error traceback
+    - *verification skipped*: source, target and restore
+    - *states unreachable*: a list of states that failed or can't be reached anymore
+    - *plan computed*: a list of steps and the cost of the plan
+
+    State names are used instead of the state classes so that the events can be serialized as they are.
+
+    The subscribers are called from a background thread so that slow sinks never stall the crawl. A subscriber is any
+    callable that accepts an event. Exceptions raised by the subscribers are ignored.
+
+    >>> ring = RingBuffer(1000)
+    >>> scm.events = EventBus()
+    >>> scm.events.subscribe(ring)
+    >>> scm.events.subscribe(JsonLinesWriter("events.jsonl"))
+    >>> scm.verify_all_states()
+    >>> scm.events.close()
+    """
+
+    STEP_STARTED = "step started"
+    TRANSITION_OK = "transition ok"
+    TRANSITION_FAILED = "transition failed"
+    VERIFICATION_OK = "verification ok"
+    VERIFICATION_FAILED = "verification failed"
+    VERIFICATION_SKIPPED = "verification skipped"
+    STATES_UNREACHABLE = "states unreachable"
+    PLAN_COMPUTED = "plan computed"
+    FAILURES = (TRANSITION_FAILED, VERIFICATION_FAILED)
+
+    def __init__(self):
+        self._subscribers = []
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._dispatch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def subscribe(self, subscriber):
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.remove(subscriber)
+
+    def publish(self, event, **fields):
+        fields["event"] = event
+        fields["time"] = time.time()
+        self._queue.put(fields)
+
+    def _dispatch(self):
+        while True:
+            event = self._queue.get()
+            try:
+                if event is None:
+                    return
+                for subscriber in list(self._subscribers):
+                    try:
+                        subscriber(event)
+                    except Exception:
+                        pass
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """ Waits till all the events published so far are delivered """
+        self._queue.join()
+
+    def close(self):
+        """ Delivers the pending events, stops the background thread and closes the subscribers that can be closed """
+        self._queue.put(None)
+        self._thread.join()
+        for subscriber in self._subscribers:
+            if hasattr(subscriber, "close"):
+                subscriber.close()
+
+
+class JsonLinesWriter(object):
+    """ A subscriber that appends every event as a JSON line to a file
+
+    path (str)
+        file to append the events to
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a")
+
+    def __call__(self, event):
+        self._file.write(json.dumps(event, sort_keys=True) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class RingBuffer(object):
+    """ A subscriber that keeps the latest events in memory
+
+    size (int)
+        how many events to keep
+    """
+
+    def __init__(self, size):
+        self._events = deque(maxlen=size)
+
+    def __call__(self, event):
+        self._events.append(event)
+
+    @property
+    def events(self):
+        """ A list of the kept events, the oldest one first """
+        return list(self._events)
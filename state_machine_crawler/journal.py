@@ -0,0 +1,58 @@
+import json
+import threading
+import time
+
+
+class Journal(object):
+    """ An append-only log of every step made by the crawler. Each line of the file is a JSON record with the names of
+    the source and the target states, the outcome, durations of the transition and the verification and a traceback
+    of an error if there was one.
+
+    path (str)
+        file to write the records to
+    append (bool)
+        keep the records already in the file, e.g. to :meth:`resume <StateMachineCrawler.resume>` a run from it later.
+        Otherwise the file is truncated, so that it holds a single run only
+
+    >>> scm.journal = Journal("crawl.journal")
+    >>> scm.verify_all_states(full=True)
+    """
+
+    OK = "ok"
+    SKIPPED = "skipped"
+    TRANSITION_FAILURE = "transition failure"
+    VERIFICATION_FAILURE = "verification failure"
+    FAILURES = (TRANSITION_FAILURE, VERIFICATION_FAILURE)
+
+    def __init__(self, path, append=True):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if append else "w")
+
+    def record(self, source, target, outcome, restore, transition_time, verification_time=None, error=None):
+        line = json.dumps({
+            "time": time.time(),
+            "source": source.full_name,
+            "target": target.full_name,
+            "outcome": outcome,
+            "restore": restore,
+            "transition_time": transition_time,
+            "verification_time": verification_time,
+            "error": error
+        }, sort_keys=True)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read(path):
+        """ Iterates over the records of a journal file. A truncated last line of a killed run is ignored. """
+        with open(path) as fil:
+            for line in fil:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
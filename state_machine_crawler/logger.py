@@ -57,17 +57,28 @@ class StateLogger(object):
         self._c(False)
         self._pr("\n")
 
+    def skip(self):
+        self._c(None)
+        self._pr("\n")
+
     def transition(self):
         self._pr("\tTransition   ")
 
     def verification(self):
         self._pr("\tVerification ")
 
+    def snapshot(self):
+        self._pr("\tSnapshot     ")
+
     def show_traceback(self):
         if self._debug:
             self._pr("\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>\n")
             traceback.print_exc()
             self._pr("<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<\n")
 
+    def plan(self, plan):
+        if self._debug:
+            self._pr("Planned %d steps: cost %s, naive cost %s\n" % (len(plan.steps) - 1, plan.cost, plan.naive_cost))
+
     def err(self, msg):
         self._pr(str(msg))
@@ -0,0 +1,110 @@
+import threading
+from collections import defaultdict
+
+from .errors import TransitionError
+from .state_machine_crawler import _find_closest_node, _find_closest_transition
+
+
+class ParallelCrawler(object):
+    """ Crawls several identical systems at once. Each system is driven by its own thread.
+
+    state_machine(:class:`StateMachineCrawler <state_machine_crawler.StateMachineCrawler>` instance)
+        State machine with all the states registered. It collects the combined results of all the workers.
+    systems (list or callable)
+        Systems to be crawled or a factory that creates a new system when called without arguments
+    workers (int=None)
+        Number of systems to be created via the factory. Ignored if *systems* is a list.
+
+    Each worker takes the cheapest target from its current position out of the pool of states (and transitions)
+    that were not handled by any other worker yet.
+
+    >>> crawler = ParallelCrawler(state_machine, [device_one, device_two])
+    >>> crawler.verify_all_states(full=True)
+    """
+
+    def __init__(self, state_machine, systems, workers=None):
+        if callable(systems):
+            systems = [systems() for _ in range(workers or 1)]
+        self._state_machine = state_machine
+        self._crawlers = [state_machine._fork(system) for system in systems]
+        self._lock = threading.Lock()
+        self._pending = None
+        self._errors = []
+
+    def _claim_state(self, crawler):
+        """ Returns a path from the current state of the @crawler to the closest state from the pool and removes the
+        state from the pool """
+        self._pending -= crawler._visited_states | crawler._error_states
+        path = _find_closest_node(crawler._get_reachable_graph(), crawler.state, self._pending,
+                                  crawler._get_cost_function())
+        if path:
+            self._pending.discard(path[-1])
+        return path
+
+    def _claim_transition(self, crawler):
+        """ Returns a path from the current state of the @crawler that ends with the closest transition from the pool
+        and removes the transition from the pool """
+        for source, target in crawler._visited_transitions | crawler._error_transitions:
+            if source in self._pending:
+                self._pending[source].discard(target)
+        path = _find_closest_transition(crawler._get_reachable_graph(), crawler.state, self._pending,
+                                        crawler._get_cost_function())
+        if path:
+            self._pending[path[-2]].discard(path[-1])
+        return path
+
+    def _work(self, crawler, claim):
+        try:
+            while True:
+                with self._lock:
+                    path = claim(crawler)
+                if not path:
+                    break
+                try:
+                    for index, next_state in enumerate(path[1:], 2):
+                        crawler._do_step(next_state, index == len(path))
+                except TransitionError, e:
+                    crawler.log.err(e)
+            crawler.move(crawler.EntryPoint)
+        except Exception, e:
+            self._errors.append(e)
+
+    def _run(self, pending, claim):
+        self._pending = pending
+        threads = [threading.Thread(target=self._work, args=(crawler, claim)) for crawler in self._crawlers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def _merge(self):
+        state_machine = self._state_machine
+        for crawler in self._crawlers:
+            state_machine._visited_states |= crawler._visited_states
+            state_machine._visited_transitions |= crawler._visited_transitions
+            state_machine._error_states |= crawler._error_states
+            state_machine._error_transitions |= crawler._error_transitions
+        state_machine._reachability = None
+        state_machine._reset_path_table()
+
+    def verify_all_states(self, pattern=None, full=False):
+        """
+        Same as :meth:`verify_all_states <state_machine_crawler.StateMachineCrawler.verify_all_states>` of the
+        :class:`StateMachineCrawler <state_machine_crawler.StateMachineCrawler>` but the work is shared between all the
+        systems
+        """
+        state_machine = self._state_machine
+        self._errors = []
+        graph = state_machine._get_reachable_graph()
+        self._run(state_machine._get_unvisited_states(graph, pattern), self._claim_state)
+        if full:
+            pending = defaultdict(set)
+            for source, target in state_machine._get_unexecuted_transitions(pattern):
+                pending[source].add(target)
+            self._run(pending, self._claim_transition)
+        self._merge()
+        if state_machine._error_states:
+            failed_states = map(str, state_machine._error_states)
+            raise TransitionError("Failed to visit the following states: %s" % ", ".join(sorted(failed_states)))
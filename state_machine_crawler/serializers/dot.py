@@ -11,6 +11,34 @@ def node_id(name):
     return name.strip().replace(".", "_").replace(" ", "_")
 
 
+def get_state_colors(state):
+    """ Returns fill and text colors of a state dict of :meth:`StateMachineCrawler.as_graph` """
+    if state["current"]:
+        return "blue", "white"
+    elif state["next"]:
+        return "dodgerblue", "black"
+    elif state["failed"]:
+        if state["visited"]:
+            return "orange", "black"
+        return "red", "black"
+    elif state["visited"]:
+        return "forestgreen", "white"
+    return "white", "black"
+
+
+def get_transition_colors(transition):
+    """ Returns line and text colors of a transition dict of :meth:`StateMachineCrawler.as_graph` """
+    if transition["failed"]:
+        if transition["visited"]:
+            return "orange", "orange"
+        return "red", "red"
+    elif transition["current"]:
+        return "blue", "blue"
+    elif transition["visited"]:
+        return "forestgreen", "forestgreen"
+    return "black", "black"
+
+
 def serialize_state(state):
     if state["_entry"] is StateMachineCrawler.EntryPoint:
         shape = "doublecircle"
@@ -18,24 +46,7 @@ def serialize_state(state):
     else:
         shape = "box"
         label = state["name"].split(".")[-1]
-    if state["current"]:
-        color = "blue"
-        text_color = "white"
-    elif state["next"]:
-        color = "dodgerblue"
-        text_color = "black"
-    elif state["failed"]:
-        if state["visited"]:
-            color = "orange"
-        else:
-            color = "red"
-        text_color = "black"
-    elif state["visited"]:
-        color = "forestgreen"
-        text_color = "white"
-    else:
-        color = "white"
-        text_color = "black"
+    color, text_color = get_state_colors(state)
 
     return NODE_TPL % dict(
         name=node_id(state["name"]),
@@ -46,17 +57,7 @@ def serialize_state(state):
 
 
 def serialize_transition(transition):
-    if transition["failed"]:
-        if transition["visited"]:
-            color = text_color = "orange"
-        else:
-            color = text_color = "red"
-    elif transition["current"]:
-        color = text_color = "blue"
-    elif transition["visited"]:
-        color = text_color = "forestgreen"
-    else:
-        color = text_color = "black"
+    color, text_color = get_transition_colors(transition)
 
     if transition["cost"] == 1:
         label = " "
@@ -0,0 +1,51 @@
+import json
+
+from .dot import get_state_colors, get_transition_colors
+
+STATE_FIELDS = ("name", "current", "next", "visited", "failed")
+TRANSITION_FIELDS = ("name", "cost", "current", "visited", "failed")
+
+
+class Serializer(object):
+    """ The graph of :meth:`StateMachineCrawler.as_graph` in a compact form that can be rendered by a browser:
+
+    - *version*: :attr:`StateMachineCrawler.graph_version` of the graph
+    - *states*: a list of the states, the index of a state in the list is its id
+    - *transitions*: a list of the transitions with the ids of their *source* and *target* states. The transitions to
+      the states that are not in the graph (e.g. the ones the names of which start with an underscore) are left out
+
+    Besides the status flags every state and transition has the *color* and *text_color* of the dot serializer.
+    """
+
+    mimetype = "application/json"
+
+    def __init__(self, scm):
+        self._scm = scm
+
+    def __repr__(self):
+        graph = self._scm.as_graph()
+        names = sorted(graph)
+        ids = dict((name, index) for index, name in enumerate(names))
+
+        states = []
+        transitions = []
+        for name in names:
+            state = graph[name]
+            state_data = dict((field, state[field]) for field in STATE_FIELDS)
+            state_data["color"], state_data["text_color"] = get_state_colors(state)
+            states.append(state_data)
+            for target in sorted(state["transitions"]):
+                if target not in ids:
+                    continue
+                transition = state["transitions"][target]
+                transition_data = dict((field, transition[field]) for field in TRANSITION_FIELDS)
+                transition_data["source"] = ids[name]
+                transition_data["target"] = ids[target]
+                transition_data["color"], transition_data["text_color"] = get_transition_colors(transition)
+                transitions.append(transition_data)
+
+        return json.dumps({
+            "version": self._scm.graph_version,
+            "states": states,
+            "transitions": transitions
+        }, separators=(",", ":"), sort_keys=True)
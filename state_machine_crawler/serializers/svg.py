@@ -1,15 +1,136 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from xml.sax.saxutils import unescape
+
 import pydot
 
-from .dot import Serializer as DotSerializer
+from .dot import Serializer as DotSerializer, node_id, get_state_colors, get_transition_colors
+
+
+GROUP_RE = re.compile(r'(<g [^>]*class="(node|edge)"[^>]*>\s*<title>(.*?)</title>)(.*?)(</g>)', re.DOTALL)
+TAG_RE = re.compile(r"<(polygon|ellipse|path|text)\b[^>]*>")
+
+
+def _set_attribute(tag, name, value):
+    """ Sets the attribute @name of the opening @tag to the @value. A "none" value is kept as it is """
+    pattern = re.compile(r'(\s%s=")([^"]*)(")' % name)
+    match = pattern.search(tag)
+    if match is None:
+        end = len(tag) - (2 if tag.endswith("/>") else 1)
+        return '%s %s="%s"%s' % (tag[:end], name, value, tag[end:])
+    if match.group(2) == "none":
+        return tag
+    return tag[:match.start(2)] + value + tag[match.end(2):]
+
+
+def _restyle_node(body, color, text_color):
+
+    def restyle(match):
+        tag = match.group(0)
+        if match.group(1) == "text":
+            return _set_attribute(tag, "fill", text_color)
+        elif match.group(1) in ("polygon", "ellipse"):
+            return _set_attribute(tag, "fill", color)
+        return tag
+
+    return TAG_RE.sub(restyle, body)
+
+
+def _restyle_edge(body, color, text_color):
+
+    def restyle(match):
+        tag = match.group(0)
+        if match.group(1) == "text":
+            return _set_attribute(tag, "fill", text_color)
+        tag = _set_attribute(tag, "stroke", color)
+        if match.group(1) == "polygon":
+            tag = _set_attribute(tag, "fill", color)
+        return tag
+
+    return TAG_RE.sub(restyle, body)
+
+
+def _parse_layout(svg):
+    """ Splits the @svg into a list of literal chunks and (kind, title, body) tuples of the nodes and the edges """
+    chunks = []
+    position = 0
+    for match in GROUP_RE.finditer(svg):
+        chunks.append(svg[position:match.start()] + match.group(1))
+        chunks.append((match.group(2), unescape(match.group(3), {"&#45;": "-"}), match.group(4)))
+        position = match.start(5)
+    chunks.append(svg[position:])
+    return chunks
+
+
+def get_structure_key(graph):
+    """ Returns a hash of everything in the @graph of :meth:`StateMachineCrawler.as_graph` that affects the layout """
+    structure = []
+    for name, state in graph.iteritems():
+        structure.append(name)
+        for target, transition in state["transitions"].iteritems():
+            structure.append((name, target, transition["cost"]))
+    structure.sort()
+    return hashlib.sha1(repr(structure)).hexdigest()
 
 
 class Serializer(object):
+    """ Renders the graph with Graphviz. The laid out graph is cached by the structure of the graph: as long as no
+    states or transitions are added, the colors of the cached layout are rewritten instead of running Graphviz again.
+    """
+
     mimetype = "image/svg+xml"
 
+    LAYOUT_CACHE_SIZE = 8
+
+    _layouts = OrderedDict()
+    _lock = threading.Lock()
+
     def __init__(self, scm):
+        self._scm = scm
         self._dot_serializer = DotSerializer(scm)
 
-    def __repr__(self):
+    def _layout(self):
         dot = repr(self._dot_serializer)
         graph = pydot.graph_from_dot_data(dot)
-        return graph.create_svg()
+        return _parse_layout(graph.create_svg())
+
+    def _get_layout(self, key):
+        cls = type(self)
+        with cls._lock:
+            layout = cls._layouts.pop(key, None)
+            if layout is not None:
+                cls._layouts[key] = layout
+                return layout
+        layout = self._layout()
+        with cls._lock:
+            cls._layouts[key] = layout
+            while len(cls._layouts) > cls.LAYOUT_CACHE_SIZE:
+                cls._layouts.popitem(last=False)
+        return layout
+
+    def __repr__(self):
+        graph = self._scm.as_graph()
+        layout = self._get_layout(get_structure_key(graph))
+
+        node_colors = {}
+        edge_colors = {}
+        for name, state in graph.iteritems():
+            node_colors[node_id(name)] = get_state_colors(state)
+            for transition in state["transitions"].itervalues():
+                edge_id = "%s->%s" % (node_id(transition["source"]), node_id(transition["target"]))
+                edge_colors[edge_id] = get_transition_colors(transition)
+
+        rval = []
+        for chunk in layout:
+            if isinstance(chunk, basestring):
+                rval.append(chunk)
+                continue
+            kind, title, body = chunk
+            if kind == "node" and title in node_colors:
+                body = _restyle_node(body, *node_colors[title])
+            elif kind == "edge" and title in edge_colors:
+                body = _restyle_edge(body, *edge_colors[title])
+            rval.append(body)
+        return "".join(rval)
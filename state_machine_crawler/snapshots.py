@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+
+class Snapshots(object):
+    """ A cache of snapshots of the system that lets the crawler jump directly to the states it has already verified
+    instead of replaying the transitions leading to them
+
+    take (callable)
+        take(system) captures the current condition of the system and returns a token (e.g. VM snapshot id, DB
+        savepoint name, a deep copy of an in-memory model)
+    restore (callable)
+        restore(system, token) brings the system back to the condition captured in the token
+    capacity (int=10)
+        maximal number of snapshots to keep
+    cost (int=1)
+        relative *price* of a restore, see :func:`transition <state_machine_crawler.transition>`
+    max_size (int=None)
+        maximal summary size of all snapshots kept
+    get_size (callable=None)
+        get_size(token) returns a size of a snapshot, required if *max_size* is set
+    release (callable=None)
+        release(token) is called when a snapshot gets evicted from the cache
+
+    Least recently used snapshots are evicted first.
+
+    >>> scm.snapshots = Snapshots(lambda system: system.checkpoint(), lambda system, token: system.rollback(token))
+    """
+
+    def __init__(self, take, restore, capacity=10, cost=1, max_size=None, get_size=None, release=None):
+        self._take = take
+        self._restore = restore
+        self.capacity = capacity
+        self.cost = cost
+        self.max_size = max_size
+        self._get_size = get_size
+        self._release = release
+        self._tokens = OrderedDict()
+        self._size = 0
+
+    def _fork(self):
+        """ Returns an empty cache with the same settings for another system """
+        return Snapshots(self._take, self._restore, self.capacity, self.cost, self.max_size, self._get_size,
+                         self._release)
+
+    def __contains__(self, state):
+        return state in self._tokens
+
+    def __iter__(self):
+        return iter(self._tokens)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def _over_budget(self):
+        if len(self._tokens) > self.capacity:
+            return True
+        return self.max_size is not None and self._size > self.max_size
+
+    def discard(self, state):
+        """ Drops the snapshot of the @state from the cache """
+        token = self._tokens.pop(state, None)
+        if token is None:
+            return
+        if self._get_size:
+            self._size -= self._get_size(token)
+        if self._release:
+            self._release(token)
+
+    def take(self, state, system):
+        """ Captures the @system known to be in the @state """
+        if state in self._tokens:
+            return
+        token = self._take(system)
+        self._tokens[state] = token
+        if self._get_size:
+            self._size += self._get_size(token)
+        while self._tokens and self._over_budget():
+            self.discard(next(iter(self._tokens)))
+
+    def create_transition(self, state):
+        """ Returns a transition that restores the snapshot of the @state """
+        token = self._tokens.pop(state)
+        self._tokens[state] = token
+
+        def restore(state_instance):
+            self._restore(state_instance._system, token)
+
+        restore.cost = self.cost
+        restore.target_state = state
+        restore.source_state = None
+        restore.im_class = state
+        restore.original = restore
+        restore.snapshot = True
+        return restore
@@ -1,31 +1,273 @@
 import re
+import os
+import sys
+import json
+import hashlib
+import time
+import traceback
+import heapq
+import copy
 import inspect
-from collections import defaultdict
+import itertools
+import threading
+from array import array
+from contextlib import contextmanager
+from functools import partial
+from collections import defaultdict, deque
 
 from .errors import TransitionError, DeclarationError, UnreachableStateError, NonExistentStateError, MultipleStatesError
 from .blocks import State
 from .logger import StateLogger
+from .timings import Timings
+from .verification import Always
+from .journal import Journal
+from .events import EventBus
 from .collection import StateCollection
 
 
-def _find_shortest_path(graph, start, end, path=[], get_cost=len):
-    """ Derived from `here <https://www.python.org/doc/essays/graphs/>`_
+def _unit_cost(source, target):
+    return 1
 
-    Finds the shortest path between two states. Estimations are based on a sum of costs of all transitions.
+
+def _iter_cheapest(graph, start, previous, get_cost=None):
+    """ Dijkstra's algorithm. Iterates over (cost, node) pairs of all the nodes reachable from @start in the order of
+    increasing cost of the cheapest path to them. The @previous dict is filled with the links of the cheapest paths.
+
+    get_cost (callable=None)
+        get_cost(source, target) returns a non negative cost of a single transition. Every transition costs 1 if
+        omitted. A :class:`_CompactGraph` looks up the costs it was created with instead of calling the function if it
+        is the same one.
+    """
+    if isinstance(graph, _CompactGraph):
+        return graph.iter_cheapest(start, previous, get_cost)
+    return _iter_cheapest_in_dict(graph, start, previous, get_cost)
+
+
+def _iter_cheapest_in_dict(graph, start, previous, get_cost=None):
+    get_cost = get_cost or _unit_cost
+    counter = itertools.count()
+    costs = {start: 0}
+    done = set()
+    queue = [(0, next(counter), start)]
+    while queue:
+        cost, _, node = heapq.heappop(queue)
+        if node in done:
+            continue
+        done.add(node)
+        yield cost, node
+        for child in graph.get(node, ()):
+            if child in done:
+                continue
+            child_cost = cost + get_cost(node, child)
+            if child not in costs or child_cost < costs[child]:
+                costs[child] = child_cost
+                previous[child] = node
+                heapq.heappush(queue, (child_cost, next(counter), child))
+
+
+def _get_path(previous, start, end):
+    """ Restores the path from @start to @end out of the links collected by :func:`_iter_cheapest` """
+    path = [end]
+    while end != start:
+        end = previous[end]
+        path.append(end)
+    path.reverse()
+    return path
+
+
+def _get_path_cost(path, get_cost):
+    return sum(get_cost(source, target) for source, target in zip(path, path[1:]))
+
+
+def _find_shortest_path(graph, start, end, get_cost=None):
+    """ Finds the cheapest path between two states using Dijkstra's algorithm.
+
+    get_cost (callable=None)
+        see :func:`_iter_cheapest`
+
+    Returns a list of states or None if there is no way to get from *start* to *end*.
     """
-    path = path + [start]
     if start == end:
-        return path
+        return [start]
     if start not in graph:
         return None
-    shortest = None
-    for node in graph[start]:
-        if node not in path:
-            newpath = _find_shortest_path(graph, node, end, path, get_cost)
-            if newpath:
-                if not shortest or get_cost(newpath) < get_cost(shortest):
-                    shortest = newpath
-    return shortest
+    previous = {}
+    for _, node in _iter_cheapest(graph, start, previous, get_cost):
+        if node == end:
+            return _get_path(previous, start, end)
+    return None
+
+
+def _find_closest_node(graph, start, nodes, get_cost):
+    """ Returns the cheapest path from @start to one of the @nodes or None if none of them can be reached """
+    previous = {}
+    for _, node in _iter_cheapest(graph, start, previous, get_cost):
+        if node in nodes:
+            return _get_path(previous, start, node)
+    return None
+
+
+def _find_closest_transition(graph, start, transitions, get_cost):
+    """ Returns the cheapest path from @start that ends with one of the @transitions. @transitions is a dict mapping
+    source nodes to sets of target nodes. Returns None if none of the @transitions can be reached. """
+    previous = {}
+    best = None
+    for cost, node in _iter_cheapest(graph, start, previous, get_cost):
+        if best and cost >= best[0]:
+            break
+        for target in transitions.get(node, ()):
+            total = cost + get_cost(node, target)
+            if not best or total < best[0]:
+                best = total, node, target
+    if not best:
+        return None
+    _, source, target = best
+    return _get_path(previous, start, source) + [target]
+
+
+def _plan_transition_coverage(graph, start, transitions, get_cost):
+    """
+    Builds a walk through the @graph that starts in the @start node and goes through all @transitions.
+
+    Finding the cheapest walk is a directed rural postman problem which is NP-hard. The walk is approximated greedily:
+    it keeps following the cheapest path that ends with a transition that was not covered yet. Transitions exercised
+    on the way are covered as well.
+
+    Returns a list of nodes. Transitions that cannot be reached from @start are left out.
+    """
+    pending = defaultdict(set)
+    for source, target in transitions:
+        pending[source].add(target)
+    walk = [start]
+    while pending:
+        path = _find_closest_transition(graph, walk[-1], pending, get_cost)
+        if path is None:
+            break
+        for source, target in zip(path, path[1:]):
+            targets = pending.get(source)
+            if targets and target in targets:
+                targets.remove(target)
+                if not targets:
+                    del pending[source]
+        walk.extend(path[1:])
+    return walk
+
+
+def _get_naive_coverage_cost(graph, start, transitions, get_cost):
+    """ Returns the cost of exercising the @transitions one by one, moving to the source of each of them via the
+    cheapest path """
+    cost = 0
+    cursor = start
+    for source, target in transitions:
+        path = _find_shortest_path(graph, cursor, source, get_cost)
+        if path is None:
+            continue
+        cost += _get_path_cost(path + [target], get_cost)
+        cursor = target
+    return cost
+
+
+def _get_prefix_costs(tour, get_distance):
+    """ Returns the costs of the prefixes of the @tour walked forward and backward """
+    forward = [0]
+    backward = [0]
+    for source, target in zip(tour, tour[1:]):
+        forward.append(forward[-1] + get_distance(source, target))
+        backward.append(backward[-1] + get_distance(target, source))
+    return forward, backward
+
+
+def _improve_tour(tour, get_distance, max_passes=100):
+    """ Improves an open @tour with a fixed first node via the 2-opt heuristic: reverses the segments of the tour while
+    it makes the tour cheaper. Distances may be asymmetric.
+
+    Every pass tries all the segments and applies each reversal that makes the tour cheaper. The passes are repeated
+    till none of the reversals helps or *max_passes* passes are made. """
+    tour = list(tour)
+    size = len(tour)
+    for _ in range(max_passes):
+        forward, backward = _get_prefix_costs(tour, get_distance)
+        improved = False
+        for i in range(1, size - 1):
+            for j in range(i + 1, size):
+                old = get_distance(tour[i - 1], tour[i]) + forward[j] - forward[i]
+                new = get_distance(tour[i - 1], tour[j]) + backward[j] - backward[i]
+                if j < size - 1:
+                    old += get_distance(tour[j], tour[j + 1])
+                    new += get_distance(tour[i], tour[j + 1])
+                if new < old:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    forward, backward = _get_prefix_costs(tour, get_distance)
+                    improved = True
+        if not improved:
+            break
+    return tour
+
+
+def _plan_state_tour(graph, start, targets, get_cost):
+    """
+    Builds a walk through the @graph that starts in the @start node and visits all @targets.
+
+    The cheapest paths between all the targets are precomputed. The order of the targets is chosen by always going to
+    the closest target that was not visited yet and then improved via :func:`_improve_tour`.
+
+    Returns a list of nodes. Targets that cannot be reached from @start are left out.
+    """
+    infinity = float("inf")
+    tables = {}
+    for node in set(targets) | {start}:
+        previous = {}
+        costs = dict((child, cost) for cost, child in _iter_cheapest(graph, node, previous, get_cost))
+        tables[node] = costs, previous
+
+    def get_distance(source, target):
+        return tables[source][0].get(target, infinity)
+
+    tour = [start]
+    left = set(targets) - {start}
+    while left:
+        closest = min(left, key=partial(get_distance, tour[-1]))
+        if get_distance(tour[-1], closest) == infinity:
+            break
+        tour.append(closest)
+        left.remove(closest)
+
+    tour = _improve_tour(tour, get_distance)
+
+    walk = [start]
+    for source, target in zip(tour, tour[1:]):
+        walk.extend(_get_path(tables[source][1], source, target)[1:])
+    return walk
+
+
+def _get_naive_tour_cost(graph, start, targets, get_cost):
+    """ Returns the cost of visiting the @targets one by one in a depth first search order """
+    cost = 0
+    cursor = start
+    for target in _dfs(graph, start):
+        if target not in targets:
+            continue
+        path = _find_shortest_path(graph, cursor, target, get_cost)
+        if path is None:
+            continue
+        cost += _get_path_cost(path, get_cost)
+        cursor = target
+    return cost
+
+
+def _get_reachable_nodes(graph, entry_point):
+    """ Returns a set of all nodes of the @graph that can be reached from the @entry_point via a breadth first
+    search """
+    if isinstance(graph, _CompactGraph):
+        return graph.get_reachable(entry_point)
+    reachable = {entry_point}
+    queue = deque([entry_point])
+    while queue:
+        for child in graph.get(queue.popleft(), ()):
+            if child not in reachable:
+                reachable.add(child)
+                queue.append(child)
+    return reachable
 
 
 def _create_state_map(all_states):
@@ -40,7 +282,21 @@ def _create_state_map(all_states):
     return state_map
 
 
-def _create_transition_map(all_states):
+def _get_transition_key(state, attr):
+    """ Returns the (source, target) pair of the transition @attr of the @state """
+    if attr.source_state:
+        return attr.source_state, state
+
+    target = attr.target_state
+    if target == "self":
+        target = state
+
+    return state, target
+
+
+def _create_transition_map(all_states, names=None):
+    """ Returns a dict mapping (source, target) pairs to transitions. If a @names dict is passed it gets filled with
+    (holder state, attribute name) pairs under the same keys. """
     transition_map = {}
     for state in all_states:
         for name in dir(state):
@@ -49,84 +305,645 @@ def _create_transition_map(all_states):
             if not hasattr(attr, "@transition@"):
                 continue
 
-            if attr.source_state:
-                transition_map[attr.source_state, state] = attr
-            else:
-
-                target = attr.target_state
-                if target == "self":
-                    target = state
-
-                transition_map[state, target] = attr
+            key = _get_transition_key(state, attr)
+            transition_map[key] = attr
+            if names is not None:
+                names[key] = state, name
 
     return transition_map
 
 
 def _create_state_map_with_exclusions(graph, entry_point, state_exclusion_list=None,
-                                      transition_exclusion_list=None,
-                                      filtered_graph=None):
+                                      transition_exclusion_list=None):
     """
     Creates a sub_graph of a @graph with an assumption that a bunch of nodes from @state_exclusion_list are not
     reachable
     """
-    filtered_graph = filtered_graph or {}
-    state_exclusion_list = state_exclusion_list or []
-    transition_exclusion_list = transition_exclusion_list or []
-    if entry_point in state_exclusion_list:
-        return {}
-    if entry_point in filtered_graph or entry_point not in graph:
+    if isinstance(graph, _CompactGraph):
+        return graph.restrict(entry_point, state_exclusion_list or (), transition_exclusion_list or ())
+    state_exclusions = set(state_exclusion_list or ())
+    transition_exclusions = set(transition_exclusion_list or ())
+    filtered_graph = {}
+    if entry_point in state_exclusions or entry_point not in graph:
         return filtered_graph
-    filtered_graph[entry_point] = filtered_children = set()
-    for child_node in graph[entry_point]:
-        if (entry_point, child_node) in transition_exclusion_list:
-            continue
-        if _create_state_map_with_exclusions(graph, child_node, state_exclusion_list, transition_exclusion_list,
-                                             filtered_graph):
+    filtered_graph[entry_point] = set()
+    stack = [entry_point]
+    while stack:
+        node = stack.pop()
+        filtered_children = filtered_graph[node]
+        for child_node in graph[node]:
+            if child_node in state_exclusions or (node, child_node) in transition_exclusions:
+                continue
             filtered_children.add(child_node)
+            if child_node in graph and child_node not in filtered_graph:
+                filtered_graph[child_node] = set()
+                stack.append(child_node)
     return filtered_graph
 
 
 def _get_missing_nodes(graph, sub_graph, entry_point):
     """ Returns a set of nodes that are present in the @graph but are missing in the @sub_graph """
-    all_nodes = set()
+    missing = _get_reachable_nodes(graph, entry_point) - _get_reachable_nodes(sub_graph, entry_point)
+    missing.discard(entry_point)
+    return missing
+
+
+def _dfs(graph, start):
+    """ Depth first search. Returns a list of the nodes reachable from @start in the order they were visited. """
+    visited = [start]
+    seen = {start}
+    stack = [iter(set(graph[start]) - seen)]
+    while stack:
+        for node in stack[-1]:
+            if node not in seen:
+                seen.add(node)
+                visited.append(node)
+                stack.append(iter(set(graph.get(node, ())) - seen))
+                break
+        else:
+            stack.pop()
+    return visited
+
+
+class _ShortcutGraph(object):
+    """ A read only view of a @graph in which every node is also linked to all the @shortcuts that belong to the
+    @graph """
+
+    def __init__(self, graph, shortcuts):
+        self._graph = graph
+        self._shortcuts = frozenset(node for node in shortcuts if node in graph)
+
+    def __contains__(self, node):
+        return node in self._graph
+
+    def __iter__(self):
+        return iter(self._graph)
+
+    def __getitem__(self, node):
+        return self._graph[node] | self._shortcuts
+
+    def get(self, node, default=None):
+        if node not in self._graph:
+            return default
+        return self[node]
+
+
+class _Reachability(object):
+    """ Keeps track of the nodes of a @graph that can be reached from the @entry_point while nodes and edges of the
+    graph are being marked as failed.
 
-    def _add_nodes(parent):
-        if parent in all_nodes:
+    Each node has a counter of live edges coming from reachable nodes. When something fails only the region of the
+    graph reachable from the failure is revisited: the nodes of the region that still have live incoming edges from
+    the outside keep the rest of the region reachable. The bookkeeping is done on the ids of a :class:`_CompactGraph`,
+    other graphs are converted to one.
+    """
+
+    def __init__(self, graph, entry_point):
+        if not isinstance(graph, _CompactGraph):
+            graph = _CompactGraph(graph)
+        self._graph = graph
+        self._entry_id = graph.index[entry_point]
+        size = len(graph.nodes)
+        self._failed_nodes = bytearray(size)
+        self._failed_edges = set()
+        self._reachable = bytearray(size)
+        self._in_degree = [0] * size
+        for node_id in graph.get_reachable_ids(self._entry_id):
+            self._reachable[node_id] = 1
+            for child in graph.children(node_id):
+                self._in_degree[child] += 1
+
+    @property
+    def reachable(self):
+        nodes = self._graph.nodes
+        return set(nodes[node_id] for node_id, reachable in enumerate(self._reachable) if reachable)
+
+    def _get_nodes(self, node_ids):
+        nodes = self._graph.nodes
+        return set(nodes[node_id] for node_id in node_ids)
+
+    def _live_children(self, node_id):
+        failed_nodes, failed_edges = self._failed_nodes, self._failed_edges
+        return [child for child in self._graph.children(node_id)
+                if not failed_nodes[child] and (node_id, child) not in failed_edges]
+
+    def _disconnect(self, node_id):
+        self._reachable[node_id] = 0
+        for child in self._live_children(node_id):
+            self._in_degree[child] -= 1
+
+    def _prune(self, candidates):
+        """ Returns the ids of the nodes that are not reachable anymore among the ones reachable from the
+        @candidates """
+        region = set()
+        stack = [node_id for node_id in candidates if self._reachable[node_id] and node_id != self._entry_id]
+        region.update(stack)
+        while stack:
+            for child in self._live_children(stack.pop()):
+                if child not in region and child != self._entry_id:
+                    region.add(child)
+                    stack.append(child)
+
+        inner_degree = defaultdict(int)
+        for node_id in region:
+            for child in self._live_children(node_id):
+                inner_degree[child] += 1
+
+        stack = [node_id for node_id in region if self._in_degree[node_id] > inner_degree[node_id]]
+        supported = set(stack)
+        while stack:
+            for child in self._live_children(stack.pop()):
+                if child in region and child not in supported:
+                    supported.add(child)
+                    stack.append(child)
+
+        lost = region - supported
+        for node_id in lost:
+            self._disconnect(node_id)
+        return lost
+
+    def fail_node(self, node):
+        """ Marks the @node as failed and returns a set of nodes that became unreachable because of it """
+        node_id = self._graph.index.get(node)
+        if node_id is None or self._failed_nodes[node_id]:
+            return set()
+        if not self._reachable[node_id]:
+            self._failed_nodes[node_id] = 1
+            return set()
+        children = self._live_children(node_id)
+        self._disconnect(node_id)
+        self._failed_nodes[node_id] = 1
+        return self._get_nodes({node_id} | self._prune(children))
+
+    def fail_edge(self, source, target):
+        """ Marks the edge between the @source and the @target as failed and returns a set of nodes that became
+        unreachable because of it """
+        source_id, target_id = self._graph.index.get(source), self._graph.index.get(target)
+        if source_id is None or target_id is None or (source_id, target_id) in self._failed_edges:
+            return set()
+        live = self._reachable[source_id] and target_id in self._live_children(source_id)
+        self._failed_edges.add((source_id, target_id))
+        if not live:
+            return set()
+        self._in_degree[target_id] -= 1
+        return self._get_nodes(self._prune([target_id]))
+
+
+class _CompactGraph(object):
+    """ A read only graph that interns its nodes to integer ids and keeps the edges in compressed sparse row arrays: the
+    children of the node with id *i* are *targets[offsets[i]:offsets[i + 1]]* and the costs of the edges leading to them
+    are *costs[offsets[i]:offsets[i + 1]]*.
+
+    :func:`_iter_cheapest`, :func:`_get_reachable_nodes` and :func:`_create_state_map_with_exclusions` work on the ids
+    directly, the latter returns a view that shares the arrays with the graph and masks the nodes and the edges that
+    are left out. For the rest of the code the graph looks like a dict mapping nodes to frozensets of their children,
+    the ids are resolved back to the nodes only when it is accessed that way.
+
+    graph (dict)
+        maps the nodes to iterables of their children, duplicate children are dropped
+    get_cost (callable=None)
+        see :func:`_iter_cheapest`
+    """
+
+    def __init__(self, graph, get_cost=None):
+        get_cost = self._get_cost = get_cost or _unit_cost
+        self.nodes = list(graph)
+        self._size = len(self.nodes)
+        self.index = index = dict((node, node_id) for node_id, node in enumerate(self.nodes))
+        self.offsets = array("l", [0])
+        self.targets = array("i")
+        self.costs = array("d")
+        for node in self.nodes[:self._size]:
+            seen = set()
+            for child in graph[node]:
+                child_id = index.get(child)
+                if child_id is None:
+                    child_id = index[child] = len(self.nodes)
+                    self.nodes.append(child)
+                elif child_id in seen:
+                    continue
+                seen.add(child_id)
+                self.targets.append(child_id)
+                self.costs.append(get_cost(node, child))
+            self.offsets.append(len(self.targets))
+        # the nodes that are only known as children have no edges of their own
+        self.offsets.extend([len(self.targets)] * (len(self.nodes) - self._size))
+        self._length = self._size
+        # the masks of a view returned by restrict()
+        self._alive = None
+        self._excluded_edges = frozenset()
+
+    def _is_key(self, node_id):
+        return node_id < self._size and (self._alive is None or self._alive[node_id])
+
+    def children(self, node_id):
+        """ Returns the ids of the children of the node with the @node_id """
+        children = self.targets[self.offsets[node_id]:self.offsets[node_id + 1]]
+        if self._alive is None:
+            return children
+        alive, excluded_edges = self._alive, self._excluded_edges
+        if not excluded_edges:
+            return [child for child in children if alive[child]]
+        return [child for child in children if alive[child] and (node_id, child) not in excluded_edges]
+
+    def get_reachable_ids(self, start_id):
+        """ Returns a list of the ids of the nodes reachable from the node with the @start_id """
+        seen = bytearray(len(self.nodes))
+        seen[start_id] = 1
+        queue = [start_id]
+        for node_id in queue:
+            for child in self.children(node_id):
+                if not seen[child]:
+                    seen[child] = 1
+                    queue.append(child)
+        return queue
+
+    def get_reachable(self, entry_point):
+        """ See :func:`_get_reachable_nodes` """
+        entry_id = self.index.get(entry_point)
+        if entry_id is None or not self._is_key(entry_id):
+            return {entry_point}
+        nodes = self.nodes
+        return set(nodes[node_id] for node_id in self.get_reachable_ids(entry_id))
+
+    def restrict(self, entry_point, excluded_nodes=(), excluded_edges=()):
+        """ See :func:`_create_state_map_with_exclusions`. Returns a view of the graph instead of a copy. """
+        index = self.index
+        view = copy.copy(self)
+        view._alive = alive = bytearray(len(self.nodes))
+        view._excluded_edges = self._excluded_edges | frozenset(
+            (index[source], index[target]) for source, target in excluded_edges if source in index and target in index)
+        view._length = 0
+        excluded_ids = set(index[node] for node in excluded_nodes if node in index)
+        entry_id = index.get(entry_point)
+        if entry_id is None or entry_id in excluded_ids or not self._is_key(entry_id):
+            return view
+        alive[entry_id] = 1
+        queue = [entry_id]
+        for node_id in queue:
+            for child in self.children(node_id):
+                if alive[child] or child in excluded_ids or (node_id, child) in view._excluded_edges:
+                    continue
+                alive[child] = 1
+                queue.append(child)
+        view._length = sum(1 for node_id in queue if node_id < self._size)
+        return view
+
+    def iter_cheapest(self, start, previous, get_cost=None):
+        """ See :func:`_iter_cheapest`. The links of the cheapest path to a node are stored in @previous when the node
+        is reached. """
+        get_cost = get_cost or _unit_cost
+        # the costs are looked up by the positions of the edges unless they differ from the ones of the graph
+        edge_costs = self.costs if get_cost == self._get_cost else None
+        nodes = self.nodes
+        start_id = self.index.get(start)
+        if start_id is None or not self._is_key(start_id):
+            yield 0, start
+            return
+        heappush, heappop = heapq.heappush, heapq.heappop
+        offsets, targets, alive, excluded_edges = self.offsets, self.targets, self._alive, self._excluded_edges
+        counter = itertools.count()
+        costs = [None] * len(nodes)
+        costs[start_id] = 0
+        parents = [start_id] * len(nodes)
+        done = bytearray(len(nodes))
+        queue = [(0, next(counter), start_id)]
+        while queue:
+            cost, _, node_id = heappop(queue)
+            if done[node_id]:
+                continue
+            done[node_id] = 1
+            node = nodes[node_id]
+            if node_id != start_id:
+                previous[node] = nodes[parents[node_id]]
+            yield cost, node
+            for position in xrange(offsets[node_id], offsets[node_id + 1]):
+                child = targets[position]
+                if done[child] or alive is not None and (not alive[child] or
+                                                         excluded_edges and (node_id, child) in excluded_edges):
+                    continue
+                if edge_costs is None:
+                    child_cost = cost + get_cost(node, nodes[child])
+                else:
+                    child_cost = cost + edge_costs[position]
+                known_cost = costs[child]
+                if known_cost is None or child_cost < known_cost:
+                    costs[child] = child_cost
+                    parents[child] = node_id
+                    heappush(queue, (child_cost, next(counter), child))
+
+    def iteredges(self):
+        """ Iterates over the (source, target) pairs of all the edges """
+        nodes = self.nodes
+        for node_id in xrange(self._size):
+            if self._is_key(node_id):
+                source = nodes[node_id]
+                for child in self.children(node_id):
+                    yield source, nodes[child]
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, node):
+        node_id = self.index.get(node)
+        return node_id is not None and self._is_key(node_id)
+
+    def __iter__(self):
+        nodes = self.nodes
+        if self._alive is None:
+            return iter(nodes[:self._size])
+        alive = self._alive
+        return (nodes[node_id] for node_id in xrange(self._size) if alive[node_id])
+
+    def __getitem__(self, node):
+        if node not in self:
+            raise KeyError(node)
+        nodes = self.nodes
+        return frozenset(nodes[child] for child in self.children(self.index[node]))
+
+    def get(self, node, default=None):
+        if node not in self:
+            return default
+        return self[node]
+
+    def iteritems(self):
+        for node in self:
+            yield node, self[node]
+
+
+class _PathTable(object):
+    """ A table of next hops of the cheapest paths between all pairs of nodes of a :class:`_CompactGraph`.
+
+    The row of a target node is an array that holds the id of the next hop towards the target for every node of the
+    graph (or -1 if the target can't be reached). A row is computed with Dijkstra's algorithm over the reversed edges
+    when the target is requested for the first time and is never modified afterwards. When a node or an edge fails only
+    the rows that route through it are dropped. The rows computed before any failure stay valid when the failures are
+    cleared.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+        size = len(graph.nodes)
+        # the reversed edges in the same compressed sparse row layout
+        self._parent_offsets = array("l", [0]) * (size + 1)
+        for target in graph.targets:
+            self._parent_offsets[target + 1] += 1
+        for node in xrange(size):
+            self._parent_offsets[node + 1] += self._parent_offsets[node]
+        self._parents = array("i", [0]) * len(graph.targets)
+        self._parent_costs = array("d", [0]) * len(graph.targets)
+        cursor = self._parent_offsets[:-1]
+        for source in xrange(size):
+            for position in xrange(graph.offsets[source], graph.offsets[source + 1]):
+                target = graph.targets[position]
+                self._parents[cursor[target]] = source
+                self._parent_costs[cursor[target]] = graph.costs[position]
+                cursor[target] += 1
+        self._failed_nodes = set()
+        self._failed_edges = set()
+        self._rows = {}
+        self._clean_rows = set()
+
+    def copy(self):
+        """ Returns a table of the same graph with its own failures. The rows built so far are shared. """
+        path_table = copy.copy(self)
+        path_table._failed_nodes = set(self._failed_nodes)
+        path_table._failed_edges = set(self._failed_edges)
+        path_table._rows = dict(self._rows)
+        path_table._clean_rows = set(self._clean_rows)
+        return path_table
+
+    def _build_row(self, target):
+        next_hops = array("i", [-1]) * len(self._graph.nodes)
+        next_hops[target] = target
+        parent_offsets, parents, parent_costs = self._parent_offsets, self._parents, self._parent_costs
+        failed_nodes, failed_edges = self._failed_nodes, self._failed_edges
+        costs = {target: 0}
+        done = set()
+        queue = [(0, target)]
+        while queue:
+            cost, node = heapq.heappop(queue)
+            if node in done:
+                continue
+            done.add(node)
+            for position in xrange(parent_offsets[node], parent_offsets[node + 1]):
+                parent = parents[position]
+                if parent in done or parent in failed_nodes or (parent, node) in failed_edges:
+                    continue
+                parent_cost = cost + parent_costs[position]
+                if parent not in costs or parent_cost < costs[parent]:
+                    costs[parent] = parent_cost
+                    next_hops[parent] = node
+                    heapq.heappush(queue, (parent_cost, parent))
+        self._rows[target] = next_hops
+        if not failed_nodes and not failed_edges:
+            self._clean_rows.add(target)
+        return next_hops
+
+    def _drop_rows(self, is_affected):
+        for target, next_hops in self._rows.items():
+            if is_affected(next_hops):
+                del self._rows[target]
+                self._clean_rows.discard(target)
+
+    def fail_node(self, node):
+        """ Excludes the @node from all the paths """
+        node_id = self._graph.index.get(node)
+        if node_id is None or node_id in self._failed_nodes:
+            return
+        self._failed_nodes.add(node_id)
+        self._drop_rows(lambda next_hops: node_id in next_hops)
+
+    def fail_edge(self, source, target):
+        """ Excludes the edge between the @source and the @target from all the paths """
+        source_id, target_id = self._graph.index.get(source), self._graph.index.get(target)
+        if source_id is None or target_id is None or (source_id, target_id) in self._failed_edges:
             return
-        all_nodes.add(parent)
-        for child in graph.get(parent, []):
-            _add_nodes(child)
+        self._failed_edges.add((source_id, target_id))
+        self._drop_rows(lambda next_hops: next_hops[source_id] == target_id)
 
-    def _remove_nodes(parent):
-        if parent not in all_nodes:
+    def clear_failures(self):
+        """ Brings all the failed nodes and edges back. Only the rows built before any failure are kept. """
+        if not self._failed_nodes and not self._failed_edges:
             return
-        all_nodes.remove(parent)
-        for child in sub_graph.get(parent, []):
-            _remove_nodes(child)
+        self._failed_nodes = set()
+        self._failed_edges = set()
+        self._rows = dict((target, self._rows[target]) for target in self._clean_rows)
+
+    def get_path(self, start, end):
+        """ Returns the cheapest path from @start to @end as a list of nodes or None if there is no such path """
+        if start == end:
+            return [start]
+        node, target = self._graph.index.get(start), self._graph.index.get(end)
+        if node is None or target is None or node in self._failed_nodes or target in self._failed_nodes:
+            return None
+        next_hops = self._rows.get(target)
+        if next_hops is None:
+            next_hops = self._build_row(target)
+        path = [start]
+        while node != target:
+            node = next_hops[node]
+            if node == -1:
+                return None
+            path.append(self._graph.nodes[node])
+        return path
+
 
-    _add_nodes(entry_point)
-    _remove_nodes(entry_point)
+class CoveragePlan(object):
+    """ A walk through the state machine planned by the crawler
+
+    steps (list)
+        states to go through, the first one is the state the walk starts from
+    cost (int)
+        summary cost of all the transitions of the walk
+    naive_cost (int)
+        the cost of visiting the same targets one by one in an arbitrary order
+    targets (set)
+        states that have to be verified on the way no matter what the verification policy of the crawler is
+    checked_steps (set)
+        indices of the *steps* that have to be verified no matter what the verification policy of the crawler is, e.g.
+        the targets of the transitions the walk is planned to cover
+    """
 
-    return all_nodes
+    def __init__(self, steps, get_cost, get_naive_cost, targets=(), checked_steps=()):
+        self.steps = steps
+        self.targets = frozenset(targets)
+        self.checked_steps = frozenset(checked_steps)
+        self.cost = _get_path_cost(steps, get_cost)
+        self._get_naive_cost = get_naive_cost
 
+    @property
+    def naive_cost(self):
+        return self._get_naive_cost()
 
-def _dfs(graph, start, visited=None):
-    """ Recursive depth first search """
-    visited = visited or []
-    if start not in visited:
-        visited.append(start)
-    for node in set(graph[start]) - set(visited):
-        _dfs(graph, node, visited)
-    return visited
 
+def _copy_state_dict(state_dict):
+    """ Returns a copy of a state dict of :meth:`StateMachineCrawler.as_graph` along with its transition dicts """
+    copied = dict(state_dict)
+    copied["transitions"] = dict((target, dict(transition))
+                                 for target, transition in state_dict["transitions"].iteritems())
+    return copied
 
-def _get_all_unreachable_nodes(graph, entry_point, state_exclusion_list, transition_exclusion_list):
-    """ Given a @graph and a bunch of unreachable states in @state_exclusion_list calculates which other nodes cannot
-    be reached
+
+class _GraphModel(object):
+    """ The dict representation of the graph of a @crawler copies of which are returned by
+    :meth:`StateMachineCrawler.as_graph`.
+
+    The dicts of the states and the transitions are created once per registration. :meth:`sync` patches the status flags
+    of only those states and transitions the status of which changed since the previous call and bumps the *version* if
+    anything changed. The sets of visited and failed states and transitions are expected to only grow until they are
+    replaced with new ones (e.g. by :meth:`StateMachineCrawler.clear`).
+
+    The states and the transitions patched by the latest *CHANGE_LOG_SIZE* versions are kept so that the clients can
+    ask for what changed since the version they have seen, see :meth:`get_changes`.
+
+    The dicts are patched in place, so they never leave the model: :meth:`copy_graph` and :meth:`get_changes` return
+    copies made under the same lock the patching is done under.
     """
-    sub_graph = _create_state_map_with_exclusions(graph, entry_point, state_exclusion_list,
-                                                  transition_exclusion_list)
-    return _get_missing_nodes(graph, sub_graph, entry_point)
+
+    STATUS_SETS = ("_visited_states", "_error_states", "_visited_transitions", "_error_transitions")
+
+    CHANGE_LOG_SIZE = 1000
+
+    def __init__(self, crawler, version=0):
+        self._crawler = crawler
+        self._state_graph = crawler._state_graph
+        self._transition_map = crawler._transition_map
+        self._lock = threading.Lock()
+        self.version = self.structure_version = version + 1
+        self._graphs = {True: {}, False: {}}
+        self._state_dicts = {}
+        self._transition_dicts = {}
+        # states -> keys of the transitions the failed flag of which depends on them
+        self._linked = defaultdict(list)
+
+        for state in self._state_graph:
+            self._state_dicts[state] = dicts = []
+            for graph in self._graphs.itervalues():
+                graph[state.full_name] = state_dict = crawler._create_state_dict(state)
+                dicts.append(state_dict)
+
+        for (source, target), transition in self._transition_map.iteritems():
+            if source not in self._state_dicts:
+                continue
+            self._transition_dicts[source, target] = transition_dict = \
+                crawler._create_transition_dict(source, target, transition)
+            self._linked[source].append((source, target))
+            self._linked[target].append((source, target))
+            for include_entry_point, graph in self._graphs.iteritems():
+                if target is not crawler.EntryPoint or include_entry_point:
+                    graph[source.full_name]["transitions"][target.full_name] = transition_dict
+
+        self._current = crawler._current_state, crawler._next_state
+        self._applied = {}
+        # (version, patched states, patched transition keys)
+        self._change_log = deque(maxlen=self.CHANGE_LOG_SIZE)
+        for name in self.STATUS_SETS:
+            self._get_changes(name)
+
+    def matches(self, crawler):
+        """ Returns True if the structure of the graph of the @crawler has not changed """
+        return crawler._state_graph is self._state_graph and crawler._transition_map is self._transition_map
+
+    def _get_changes(self, name):
+        status_set = getattr(self._crawler, name)
+        origin, applied = self._applied.get(name, (None, set()))
+        if status_set is origin and len(status_set) == len(applied):
+            return set()
+        status_copy = set(status_set)
+        self._applied[name] = status_set, status_copy
+        return status_copy ^ applied
+
+    def sync(self):
+        """ Patches the status flags that have changed since the last call. Returns the version of the graph. """
+        crawler = self._crawler
+        with self._lock:
+            states = self._get_changes("_visited_states") | self._get_changes("_error_states")
+            transitions = self._get_changes("_visited_transitions") | self._get_changes("_error_transitions")
+            for state in states:
+                transitions.update(self._linked[state])
+            current = crawler._current_state, crawler._next_state
+            if current != self._current:
+                states.update(current + self._current)
+                transitions.update([current, self._current])
+                self._current = current
+
+            states = [state for state in states if state in self._state_dicts]
+            transitions = [key for key in transitions if key in self._transition_dicts]
+            for state in states:
+                for state_dict in self._state_dicts[state]:
+                    state_dict.update(crawler._get_state_status(state))
+            for key in transitions:
+                self._transition_dicts[key].update(crawler._get_transition_status(*key))
+            if states or transitions:
+                self.version += 1
+                self._change_log.append((self.version, states, transitions))
+            return self.version
+
+    def copy_graph(self, include_entry_point):
+        """ Returns a copy of the graph with or without the entry point """
+        with self._lock:
+            return dict((name, _copy_state_dict(state_dict))
+                        for name, state_dict in self._graphs[include_entry_point].iteritems())
+
+    def get_changes(self, version):
+        """ Returns the current version along with the lists of the dicts of the states and the transitions the status
+        of which changed since the @version. Returns None if the structure of the graph changed since then or the
+        @version is unknown or too old to tell. """
+        with self._lock:
+            if not self.structure_version <= version <= self.version:
+                return None
+            log = [entry for entry in self._change_log if entry[0] > version]
+            if version < self.version and (not log or log[0][0] != version + 1):
+                return None
+            states = set()
+            transitions = set()
+            for _, changed_states, changed_transitions in log:
+                states.update(changed_states)
+                transitions.update(changed_transitions)
+            return (self.version,
+                    [_copy_state_dict(self._state_dicts[state][0]) for state in states],
+                    [dict(self._transition_dicts[key]) for key in transitions])
 
 
 class StateMachineCrawler(object):
@@ -139,6 +956,20 @@ class StateMachineCrawler(object):
         otherwise the crawler won't be able to find its way through
 
     >>> scm = StateMachineCrawler(system_object, InitialState)
+
+    The graph of the states can be cached in a file between the runs, see :meth:`save_graph_cache`.
+
+    By default every state the crawler goes through is verified. It is possible to change this via
+    *verification_policy* attribute. :meth:`verify_all_states` still verifies each state at least once.
+
+    >>> scm.verification_policy = FinalTarget()
+
+    If the system supports checkpoints, set *snapshots* attribute to a
+    :class:`Snapshots <state_machine_crawler.Snapshots>` instance. The crawler then snapshots the verified states and
+    restores the snapshots whenever it is cheaper than replaying the transitions.
+
+    To be able to resume a long run after an interruption, set *journal* attribute to a
+    :class:`Journal <state_machine_crawler.Journal>` instance and pass its file to :meth:`resume` in the next run.
     """
 
     class EntryPoint(State):
@@ -157,35 +988,221 @@ class StateMachineCrawler(object):
         def verify(self):
             return True
 
+    GRAPH_CACHE_VERSION = 3
+
+    graph_cache_path = None
+
     def __init__(self, system, initial_state):
         if not issubclass(initial_state, State):
             raise DeclarationError("%r is not a State subclass" % initial_state)
+        self._path_table = None
+        self._graph_model = None
         self.clear()
         self._system = system
         self._initial_state = initial_state
         self._registered_states = set()
+        self._registration_depth = 0
+        self._graph_cache = None
         self._current_state = self.EntryPoint
         self._reload_graphs()
         self.log = StateLogger()
+        self.timings = Timings()
+        self._measured_costs = False
+        self.verification_policy = Always()
+        self.snapshots = None
+        self.journal = None
+        self.events = None
         self._register_state(initial_state)
 
+    def _fork(self, system):
+        """ Returns a crawler for another @system that shares all registered states with this one but keeps track of
+        its own current state, visited and failed states and transitions """
+        crawler = copy.copy(self)
+        crawler._system = system
+        crawler.log = StateLogger(self.log._debug)
+        if self.snapshots is not None:
+            crawler.snapshots = self.snapshots._fork()
+        crawler._current_state = self.EntryPoint
+        crawler._graph_model = None
+        if self._path_table is not None:
+            crawler._path_table = self._path_table.copy()
+        crawler.clear()
+        return crawler
+
     def _reload_graphs(self):
-        self._state_graph = _create_state_map(self._registered_states)
+        self._graph_key = self._get_graph_key()
+        graph = self._load_graph_cache()
+        if graph is None:
+            self._transition_names = {}
+            self._transition_map = _create_transition_map(self._registered_states, self._transition_names)
+            graph = self._build_graphs()
+        for state in graph:
+            self._transition_map[state, self.EntryPoint] = self.EntryPoint._create_transition(state)
+        self._state_graph = _CompactGraph(graph, self._get_static_cost)
+        self._reachability = None
+        if self._path_table is not None:
+            self._path_table = self._create_path_table()
+
+    def _build_graphs(self):
+        """ Returns a dict mapping the registered states to the lists of the states they have transitions to """
+        graph = dict((state, list(state.outgoing)) for state in self._registered_states)
+        for state in self._registered_states:
+            for prev_state in state.incoming:
+                graph.setdefault(prev_state, []).append(state)
 
         # get rid of all the states that are not reachable from the initial one
-        dropset = set()
-        for target_state in self._state_graph:
-            if target_state is self._initial_state:
-                continue
-            if not _find_shortest_path(self._state_graph, self._initial_state, target_state):
-                dropset.add(target_state)
-        for item in dropset:
-            self._state_graph.pop(item)
-
-        for source_state, target_states in self._state_graph.iteritems():
-            target_states.add(self.EntryPoint)
+        reachable = _get_reachable_nodes(graph, self._initial_state)
+        for state in graph.keys():
+            if state in reachable:
+                graph[state].append(self.EntryPoint)
+            else:
+                del graph[state]
+
+        graph[self.EntryPoint] = [self._initial_state]
+        self._path_trees = {}
+        self._graph_cache_dirty = True
+        return graph
+
+    def _get_graph_key(self):
+        """ Returns a key identifying the registered states and the source files of the modules they and their base
+        classes are defined in. The key doesn't depend on the transitions, so a matching cache spares the scan of the
+        states for them. Returns None if the graph is not cached or a module has no source file. """
+        if not self.graph_cache_path:
+            return None
+        modules = set()
+        for state in self._registered_states:
+            # the last class is the object
+            modules.update(cls.__module__ for cls in state.__mro__[:-1])
+        sources = []
+        for name in modules:
+            path = getattr(sys.modules.get(name), "__file__", None)
+            if not path:
+                return None
+            path = os.path.splitext(path)[0] + ".py"
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            sources.append((name, stat.st_mtime, stat.st_size))
+        sources.sort()
+        names = sorted(state.full_name for state in self._registered_states)
+        if len(set(names)) != len(names):
+            return None
+        return hashlib.sha1(repr((self.GRAPH_CACHE_VERSION, self._initial_state.full_name, names,
+                                  sources))).hexdigest()
+
+    def _read_graph_cache(self):
+        if self._graph_cache is None:
+            self._graph_cache = {}
+            if os.path.isfile(self.graph_cache_path):
+                with open(self.graph_cache_path) as fil:
+                    try:
+                        self._graph_cache = json.load(fil)
+                    except ValueError:
+                        pass
+        return self._graph_cache
+
+    def _load_graph_cache(self):
+        """ Returns the graph stored in the cache file and restores the transitions and the paths. Returns None if the
+        cache does not match the registered states. """
+        if self._graph_key is None or self._read_graph_cache().get("key") != self._graph_key:
+            return None
+        data = self._graph_cache
+        # the registration only grows, so the cache can't match again; don't keep the parsed file around
+        self._graph_cache = {}
+        registered = dict((state.full_name, state) for state in self._registered_states)
+        self._transition_names = {}
+        self._transition_map = {}
+        for holder_name, name in data["transitions"]:
+            holder = registered[holder_name]
+            attr = getattr(holder, name)
+            key = _get_transition_key(holder, attr)
+            self._transition_map[key] = attr
+            self._transition_names[key] = holder, name
+        registered[self.EntryPoint.full_name] = self.EntryPoint
+        states = [registered[name] for name in data["states"]]
+        graph = dict((state, [states[child] for child in children]) for state, children in zip(states, data["graph"]))
+        self._path_trees = {}
+        for source, parents in data["paths"].iteritems():
+            self._path_trees[states[int(source)]] = dict((states[node], states[parent])
+                                                         for node, parent in enumerate(parents) if parent >= 0)
+        self._graph_cache_dirty = False
+        return graph
+
+    def save_graph_cache(self):
+        """
+        Stores the graph of the registered states, their transitions and the cheapest paths computed so far in the file
+        set via *graph_cache_path* class attribute. The next process registering the same states defined in the same
+        source files skips the scan of the states for the transitions, the construction of the graph and the path
+        computations.
+
+        The cache is disabled by default. It is keyed by the modification times and the sizes of the source files, so
+        it must not be enabled for the states that are created or changed at run time.
+
+        >>> StateMachineCrawler.graph_cache_path = ".state_machine_crawler.cache"
+        >>> scm = StateMachineCrawler(system, InitialState)
+        >>> ...
+        >>> scm.save_graph_cache()
+        """
+        if self._graph_key is None or not self._graph_cache_dirty:
+            return
+        states = list(self._state_graph)
+        ids = dict((state, state_id) for state_id, state in enumerate(states))
+        paths = {}
+        for source, previous in self._path_trees.iteritems():
+            parents = [-1] * len(states)
+            for node, parent in previous.iteritems():
+                parents[ids[node]] = ids[parent]
+            paths[ids[source]] = parents
+        data = {
+            "key": self._graph_key,
+            "states": [state.full_name for state in states],
+            "graph": [[ids[child] for child in self._state_graph[state]] for state in states],
+            "transitions": sorted((holder.full_name, name) for holder, name in self._transition_names.itervalues()),
+            "paths": paths
+        }
+        temp_path = self.graph_cache_path + ".tmp"
+        with open(temp_path, "w") as fil:
+            json.dump(data, fil, separators=(",", ":"))
+        os.rename(temp_path, self.graph_cache_path)
+        self._graph_cache_dirty = False
+
+    def _get_path_tree(self, source):
+        """ Returns the links of the cheapest paths from the @source to all other states of the intact graph """
+        if source not in self._path_trees:
+            previous = {}
+            for _ in _iter_cheapest(self._state_graph, source, previous, self._get_static_cost):
+                pass
+            self._path_trees[source] = previous
+            self._graph_cache_dirty = True
+        return self._path_trees[source]
 
-        self._state_graph[self.EntryPoint] = {self._initial_state}
+    def _get_reachability(self):
+        if self._reachability is None:
+            self._reachability = _Reachability(self._state_graph, self.EntryPoint)
+            for state in self._error_states:
+                self._reachability.fail_node(state)
+            for source_state, target_state in self._error_transitions:
+                self._reachability.fail_edge(source_state, target_state)
+        return self._reachability
+
+    def _mark_failed(self, state, transition=None):
+        """ Marks the @state (and optionally the @transition leading to it) as failed. Returns the states that became
+        unreachable """
+        reachability = self._get_reachability()
+        lost = set()
+        if transition:
+            self._error_transitions.add(transition)
+            lost.update(reachability.fail_edge(*transition))
+        lost.update(reachability.fail_node(state))
+        lost.add(state)
+        self._error_states.update(lost)
+        if self._path_table is not None:
+            if transition:
+                self._path_table.fail_edge(*transition)
+            for node in lost:
+                self._path_table.fail_node(node)
+        return lost
 
     def clear(self):
         self._registered_collections = set()
@@ -196,6 +1213,9 @@ class StateMachineCrawler(object):
         self._error_transitions = set()
         self._visited_states.add(self.EntryPoint)
         self._history = []
+        self._reachability = None
+        self._unverified_hops = 0
+        self._reset_path_table()
 
     @property
     def state(self):
@@ -207,62 +1227,245 @@ class StateMachineCrawler(object):
         text += "\nHistory: \n%s\n" % " -> ".join([hist.full_name for hist in self._history])
         raise TransitionError(text)
 
-    def _do_step(self, next_state):
+    def _run_transition(self, transition):
+        """ Invokes the @transition against the system. Any exception means that the transition has failed. """
+        transition(transition.im_class(self._system))
+
+    def _run_verification(self, state):
+        """ Verifies that the system is in the @state. Any exception means that the verification has failed. """
+        state(self._system).verify()
+
+    def _fail_verification(self, state):
+        """ Marks the @state as failed. Returns the states that became unreachable. """
+        lost = self._mark_failed(state)
+        # mark all outgoing transitions from error states as impossible
+        for error_state in lost:
+            for target_state in self._state_graph[error_state]:
+                self._error_transitions.add((error_state, target_state))
+        return lost
+
+    def _write_journal(self, source, target, outcome, restore, transition_time, verification_time=None, error=None):
+        if self.journal is not None:
+            self.journal.record(source, target, outcome, restore, transition_time, verification_time, error)
+
+    def _publish(self, event, **fields):
+        if self.events is not None:
+            self.events.publish(event, **fields)
+
+    def _publish_unreachable(self, lost):
+        if self.events is not None:
+            self._publish(EventBus.STATES_UNREACHABLE, states=sorted(lost_state.full_name for lost_state in lost))
+
+    def _do_step(self, next_state, final=True):
+        """ Moves the system to the @next_state. Only the calls to the system are guarded: the outcome is applied to
+        the crawler first and recorded (timings, journal, events) afterwards, so a failure to record it never turns
+        into a failure of the system. """
         if self._current_state is self.EntryPoint:
             self._history = []
+        current_state = self._current_state
+        transition = self._get_transition(current_state, next_state)
+        if transition is None:
+            if self.snapshots is not None and next_state in self._visited_states:
+                # the snapshot the plan relied on was evicted after the plan had been made
+                self._err(next_state, "the snapshot of the target is gone")
+            self._err(next_state, "there is no transition to the target")
         self._next_state = next_state
-        transition = self.as_graph(True)[self._current_state.full_name]["transitions"][next_state.full_name]["_entry"]
-        self.log.msg(self._current_state, self._next_state)
+        restore = getattr(transition, "snapshot", False)
+        self.log.msg(current_state, next_state)
         self.log.transition()
+        step = dict(source=current_state.full_name, target=next_state.full_name, restore=restore)
+        self._publish(EventBus.STEP_STARTED, final=final, **step)
+        error = None
+        started = time.time()
         try:
-            transition(transition.im_class(self._system))
-            self._visited_transitions.add((self._current_state, next_state))
-            transition_ok = True
-            self.log.ok()
+            self._run_transition(transition)
         except Exception:
-            self._error_transitions.add((self._current_state, next_state))
-            transition_ok = False
+            error = traceback.format_exc()
             self.log.nok()
             self.log.show_traceback()
-        if not transition_ok:
-            self._error_states = _get_all_unreachable_nodes(self._state_graph, self.EntryPoint,
-                                                            set.union(self._error_states, {next_state}),
-                                                            self._error_transitions)
+        transition_time = time.time() - started
+        if error is not None:
             self._current_state = self.EntryPoint
+            lost = ()
+            if restore:
+                self.snapshots.discard(next_state)
+            else:
+                lost = self._mark_failed(next_state, (current_state, next_state))
+            self._write_journal(current_state, next_state, Journal.TRANSITION_FAILURE, restore, transition_time,
+                                error=error)
+            self._publish(EventBus.TRANSITION_FAILED, duration=transition_time, error=error, **step)
+            if restore:
+                self._err(next_state, "snapshot restore failure")
+            self._publish_unreachable(lost)
             self._err(next_state, "transition failure")
+        self.log.ok()
+        if restore:
+            self.timings.add_restore(next_state, transition_time)
+        else:
+            self._visited_transitions.add((current_state, next_state))
+            self.timings.add_transition(current_state, next_state, transition_time, transition.cost)
+        self._publish(EventBus.TRANSITION_OK, duration=transition_time, **step)
+
         self.log.verification()
-        try:
-            next_state(self._system).verify()
-            self.log.ok()
+        if not self.verification_policy(next_state, final, self._unverified_hops, self._visited_states):
+            self.log.skip()
+            self._unverified_hops += 1
             self._current_state = next_state
             self._history.append(next_state)
-            self._visited_states.add(next_state)
             self._next_state = None
+            self._write_journal(current_state, next_state, Journal.SKIPPED, restore, transition_time)
+            self._publish(EventBus.VERIFICATION_SKIPPED, **step)
+            return
+        self._unverified_hops = 0
+        started = time.time()
+        try:
+            self._run_verification(next_state)
         except Exception:
+            error = traceback.format_exc()
             self.log.nok()
             self.log.show_traceback()
-            self._next_state = None
-            self._error_states = _get_all_unreachable_nodes(self._state_graph, self.EntryPoint,
-                                                            set.union(self._error_states, {next_state}),
-                                                            self._error_transitions)
-
-            # mark all outgoing transitions from error states as impossible
-            for state in self._error_states:
-                for target_state in self._state_graph[state]:
-                    self._error_transitions.add((state, target_state))
-
+        verification_time = time.time() - started
+        self._next_state = None
+        if error is not None:
+            lost = self._fail_verification(next_state)
             self._current_state = self.EntryPoint
+            self._write_journal(current_state, next_state, Journal.VERIFICATION_FAILURE, restore, transition_time,
+                                verification_time, error)
+            self._publish(EventBus.VERIFICATION_FAILED, duration=verification_time, error=error, **step)
+            self._publish_unreachable(lost)
             self._err(next_state, "verification failure")
+        self.log.ok()
+        self._current_state = next_state
+        self._history.append(next_state)
+        self._visited_states.add(next_state)
+        self.timings.add_verification(next_state, verification_time)
+        self._write_journal(current_state, next_state, Journal.OK, restore, transition_time, verification_time)
+        self._publish(EventBus.VERIFICATION_OK, duration=verification_time, **step)
+        if self.snapshots is not None and next_state is not self.EntryPoint:
+            self._take_snapshot(next_state)
+
+    def _take_snapshot(self, state):
+        """ Snapshots the system verified to be in the @state. A failure to take a snapshot says nothing about the
+        system, so it is only logged and the state is left without a snapshot. """
+        try:
+            self.snapshots.take(state, self._system)
+        except Exception:
+            self.log.snapshot()
+            self.log.nok()
+            self.log.show_traceback()
+
+    def _replay(self, source, target, record):
+        """ Applies the outcome of a step recorded in the journal """
+        outcome = record["outcome"]
+        restore = record["restore"]
+        if outcome == Journal.TRANSITION_FAILURE:
+            if not restore:
+                self._mark_failed(target, (source, target))
+            return
+        if restore:
+            self.timings.add_restore(target, record["transition_time"])
+        else:
+            self.timings.add_transition(source, target, record["transition_time"],
+                                        self._transition_map[source, target].cost)
+            self._visited_transitions.add((source, target))
+        if outcome == Journal.OK:
+            self.timings.add_verification(target, record["verification_time"])
+            self._visited_states.add(target)
+        elif outcome == Journal.VERIFICATION_FAILURE:
+            self._fail_verification(target)
+
+    def resume(self, journal):
+        """
+        Restores visited and failed states and transitions as well as timings from a journal of an interrupted run.
+        The system is expected to be in an unknown state, so the crawler starts from the EntryPoint. A subsequent call
+        of :meth:`verify_all_states` handles only the remaining states and transitions.
+
+        journal (str)
+            path to a journal file written via :class:`Journal <state_machine_crawler.Journal>`
+
+        >>> scm.resume("crawl.journal")
+        >>> scm.verify_all_states(full=True)
+        """
+        states = dict((state.full_name, state) for state in self._state_graph)
+        for record in Journal.read(journal):
+            source = states.get(record["source"])
+            target = states.get(record["target"])
+            # skip the states and the transitions removed from the state machine since the run
+            known = source is not None and target is not None
+            if known and (record["restore"] or (source, target) in self._transition_map):
+                self._replay(source, target, record)
+        self._current_state = self.EntryPoint
+        self._next_state = None
 
-    def _get_cost(self, states):
-        """ Returns a cumulative cost of the whole chain of transitions """
-        cost = 0
-        cursor = states[0]
-        for state in states[1:]:
-            cost += self.as_graph(True)[cursor.full_name]["transitions"][state.full_name]["_entry"].cost
-            cursor = state
+    def _get_transition(self, source, target):
+        """ Returns a transition between the @source and the @target or a restore of a snapshot of the @target if there
+        is no such transition. Returns None if there is neither. """
+        transition = self._transition_map.get((source, target))
+        if transition is None and self.snapshots is not None and target in self.snapshots:
+            return self.snapshots.create_transition(target)
+        return transition
+
+    def _get_static_cost(self, source, target):
+        """ Returns a declared cost of a transition. The initial state might be not registered yet. """
+        transition = self._transition_map.get((source, target))
+        return 1 if transition is None else transition.cost
+
+    def _get_cost_function(self):
+        """ Returns the function the paths are planned with. The static costs are kept by the graph itself. """
+        if self._measured_costs or self.snapshots is not None:
+            return self._get_transition_cost
+        return self._get_static_cost
+
+    def _get_transition_cost(self, source, target):
+        """ Returns a cost of a single transition """
+        transition = self._transition_map.get((source, target))
+        if transition is None:
+            if self._measured_costs:
+                return self.timings.get_restore_cost(target, self.snapshots.cost)
+            return self.snapshots.cost
+        cost = transition.cost
+        if self._measured_costs:
+            return self.timings.get_cost(source, target, cost)
         return cost
 
+    def use_measured_costs(self, enabled=True):
+        """
+        Makes the crawler plan its paths based on the observed durations of the transitions and verifications stored
+        in *timings* attribute instead of the static costs of the transitions.
+
+        >>> scm.timings = Timings.load("timings.json")
+        >>> scm.use_measured_costs()
+        """
+        self._measured_costs = enabled
+
+    def use_path_table(self, enabled=True):
+        """
+        Makes the crawler precompute the next hops of the cheapest paths between all pairs of states so that
+        :meth:`move` just walks the table. Failures of states and transitions invalidate only the affected parts of the
+        table. The rows of the table are computed on demand and take memory up to quadratic in the number of states. The
+        table is not used while the costs are measured or snapshots are restored.
+
+        >>> scm.use_path_table()
+        """
+        self._path_table = self._create_path_table() if enabled else None
+
+    def _create_path_table(self):
+        path_table = _PathTable(self._state_graph)
+        self._fail_path_table(path_table)
+        return path_table
+
+    def _fail_path_table(self, path_table):
+        for source_state, target_state in self._error_transitions:
+            path_table.fail_edge(source_state, target_state)
+        for state in self._error_states:
+            path_table.fail_node(state)
+
+    def _reset_path_table(self):
+        """ Makes the path table follow the failures of the crawler after they were cleared or merged """
+        if self._path_table is not None:
+            self._path_table.clear_failures()
+            self._fail_path_table(self._path_table)
+
     def _existing_state(self, name):
         found = []
         for state in self._state_graph:
@@ -293,95 +1496,187 @@ class StateMachineCrawler(object):
             state = self._existing_state(state)
         elif state not in self._registered_states:
             raise NonExistentStateError("State {0} was not registered.".format(state))
-        reachable_state_graph = _create_state_map_with_exclusions(self._state_graph,
-                                                                  self.EntryPoint,
-                                                                  self._error_states,
-                                                                  self._error_transitions)
-        shortest_path = _find_shortest_path(reachable_state_graph, self._current_state, state, get_cost=self._get_cost)
+        if self._path_table is not None and not self._measured_costs and self.snapshots is None:
+            shortest_path = self._path_table.get_path(self._current_state, state)
+        elif self._graph_key is not None and self._is_intact():
+            previous = self._get_path_tree(self._current_state)
+            shortest_path = None
+            if state in previous or state is self._current_state:
+                shortest_path = _get_path(previous, self._current_state, state)
+        else:
+            shortest_path = _find_shortest_path(self._get_reachable_graph(), self._current_state, state,
+                                                get_cost=self._get_cost_function())
         if shortest_path is None:
             raise UnreachableStateError("There is no way to achieve state %r" % state)
         if state is self._current_state:
             next_states = [state]
         else:
             next_states = shortest_path[1:]
-        for next_state in next_states:
-            self._do_step(next_state)
+        for index, next_state in enumerate(next_states, 1):
+            self._do_step(next_state, index == len(next_states))
 
     def verify_all_states(self, pattern=None, full=False):
         """
-        Makes sure that all states can be visited. It uses a depth first search to find the somewhat the quickest path.
+        Makes sure that all states can be visited. The states are visited along a walk planned by :meth:`plan_states`.
+        The walk is replanned after each failure.
 
         pattern (str=None)
             visits only the states full names of which match the pattern
         full (bool=False)
-            if True, not only all states are visited but also all transitions are exercised
+            if True, not only all states are visited but also all transitions are exercised along a walk planned by
+            :meth:`plan_transitions`
         """
 
-        all_states_to_check = _dfs(self._state_graph, self._initial_state)
+        self._follow(partial(self.plan_states, pattern))
+        if full:
+            self._follow(partial(self.plan_transitions, pattern))
 
-        actual_states_to_check = []
-        if pattern is None:
-            actual_states_to_check = all_states_to_check
-        else:
-            for state in all_states_to_check:
-                if re.match(pattern, state.full_name):
-                    actual_states_to_check.append(state)
+        self.move(self.EntryPoint)
+        if self._error_states:
+            failed_states = map(str, self._error_states)
+            raise TransitionError("Failed to visit the following states: %s" % ", ".join(sorted(failed_states)))
 
-        def _handled_call(function):
+    def _follow(self, make_plan):
+        """ Executes the plans created by @make_plan. Makes a new plan after each failure till the plan is completed """
+        while True:
+            plan = make_plan()
+            self.log.plan(plan)
+            if self.events is not None:
+                self._publish(EventBus.PLAN_COMPUTED, steps=[state.full_name for state in plan.steps], cost=plan.cost)
             try:
-                function()
+                for index, next_state in enumerate(plan.steps[1:], 1):
+                    final = index in plan.checked_steps or \
+                        (next_state in plan.targets and next_state not in self._visited_states)
+                    self._do_step(next_state, final)
+                return
             except TransitionError, e:
                 self.log.err(e)
-            except UnreachableStateError:  # pragma: no cover
-                pass  # show must go on!
 
-        for state in actual_states_to_check:
-            if state in self._error_states or state in self._visited_states:
+    def _is_intact(self):
+        """ Returns True if the graph has no failures and the costs are static """
+        return not (self._error_states or self._error_transitions or self._measured_costs or
+                    self.snapshots is not None)
+
+    def _get_reachable_graph(self):
+        graph = _create_state_map_with_exclusions(self._state_graph, self.EntryPoint, self._error_states,
+                                                  self._error_transitions)
+        if self.snapshots is not None:
+            return _ShortcutGraph(graph, self.snapshots)
+        return graph
+
+    def _get_unvisited_states(self, graph, pattern=None):
+        states = set()
+        for state in graph:
+            if state in self._visited_states:
                 continue
-            _handled_call(lambda: self.move(state))
+            if pattern and not re.match(pattern, state.full_name):
+                continue
+            states.add(state)
+        return states
 
-        if full:
+    def plan_states(self, pattern=None):
+        """
+        Plans a walk from the current state that visits all the states that were neither visited nor failed yet. The
+        walk avoids failed states and transitions.
 
-            unexecuted_transitions = set()
-            for source_state, target_states in self._state_graph.iteritems():
-                for target_state in target_states:
-                    transition = (source_state, target_state)
-                    if transition not in set.union(self._error_transitions, self._visited_transitions):
-                        if target_state is self.EntryPoint:
-                            continue
-                        if pattern and not (re.match(pattern, source_state.full_name) and
-                                            re.match(pattern, target_state.full_name)):
-                            continue
-                        unexecuted_transitions.add(transition)
+        pattern (str=None)
+            plans only the states full names of which match the pattern
 
-            # TODO: find the most optimal way to execute the rest of transitions
+        returns (:class:`CoveragePlan <state_machine_crawler.CoveragePlan>`)
 
-            for transition in unexecuted_transitions:
+        >>> plan = scm.plan_states()
+        >>> print " -> ".join(state.full_name for state in plan.steps)
+        """
+        graph = self._get_reachable_graph()
+        targets = self._get_unvisited_states(graph, pattern)
+        start = self._current_state
+        prefix = []
+        if start in targets:
+            # the current state has to be entered again to get verified
+            prefix = [start]
+            start = self.EntryPoint
+        get_cost = self._get_cost_function()
+        steps = prefix + _plan_state_tour(graph, start, targets, get_cost)
+        return CoveragePlan(steps, get_cost, lambda: _get_naive_tour_cost(graph, start, targets, get_cost), targets)
+
+    def _get_unexecuted_transitions(self, pattern=None):
+        done = self._error_transitions | self._visited_transitions
+        transitions = set()
+        for source_state, target_state in self._state_graph.iteredges():
+            if source_state in self._error_states or target_state in self._error_states:
+                continue
+            if target_state is self.EntryPoint or (source_state, target_state) in done:
+                continue
+            if pattern and not (re.match(pattern, source_state.full_name) and
+                                re.match(pattern, target_state.full_name)):
+                continue
+            transitions.add((source_state, target_state))
+        return transitions
 
-                def _call():
-                    if transition[0] != self._current_state:
-                        self.move(transition[0])
-                    self._do_step(transition[1])
+    def plan_transitions(self, pattern=None):
+        """
+        Plans a walk from the current state that exercises all the transitions that were neither executed nor failed
+        yet. The walk avoids failed states and transitions.
 
-                _handled_call(_call)
+        pattern (str=None)
+            plans only the transitions between the states full names of which match the pattern
 
-        self.move(self.EntryPoint)
-        if self._error_states:
-            failed_states = map(str, self._error_states)
-            raise TransitionError("Failed to visit the following states: %s" % ", ".join(sorted(failed_states)))
+        returns (:class:`CoveragePlan <state_machine_crawler.CoveragePlan>`)
+
+        >>> plan = scm.plan_transitions()
+        >>> print plan.cost, plan.naive_cost
+        """
+        graph = self._get_reachable_graph()
+        transitions = self._get_unexecuted_transitions(pattern)
+        get_cost = self._get_cost_function()
+        steps = _plan_transition_coverage(graph, self._current_state, transitions, get_cost)
+        # the target of every covered transition is verified to make sure that the transition led where it should
+        checked_steps = set()
+        pending = set(transitions)
+        for index, transition in enumerate(zip(steps, steps[1:]), 1):
+            if transition in pending:
+                pending.remove(transition)
+                checked_steps.add(index)
+        return CoveragePlan(steps, get_cost,
+                            lambda: _get_naive_coverage_cost(graph, self._current_state, transitions, get_cost),
+                            checked_steps=checked_steps)
 
     def _register_state(self, state, refresh=True):
-        if not (inspect.isclass(state) and issubclass(state, State)):
-            raise DeclarationError("state {0} must be a subclass of State".format(state))
-        if state is State:
-            return
-        self._registered_states.add(state)
-        for state in state.incoming + state.outgoing:
-            if state not in self._registered_states:
-                self._register_state(state)
+        """ Registers the @state along with all the states it is linked to by transitions """
+        stack = [state]
+        while stack:
+            state = stack.pop()
+            if not (inspect.isclass(state) and issubclass(state, State)):
+                raise DeclarationError("state {0} must be a subclass of State".format(state))
+            if state is State or state in self._registered_states:
+                continue
+            self._registered_states.add(state)
+            stack.extend(state.incoming + state.outgoing)
         if refresh:
+            self._refresh_graphs()
+
+    def _refresh_graphs(self):
+        if not self._registration_depth:
             self._reload_graphs()
 
+    @contextmanager
+    def registering(self):
+        """
+        Defers the rebuild of the state graph till the end of the block. No matter how many states, collections or
+        modules are registered inside of it, the graph is rebuilt only once.
+
+        >>> with scm.registering():
+        >>>     scm.register_module(module_one)
+        >>>     scm.register_module(module_two)
+        >>>     scm.register_state(SomeState)
+        """
+        self._registration_depth += 1
+        try:
+            yield self
+        finally:
+            self._registration_depth -= 1
+            self._refresh_graphs()
+
     def register_state(self, state):
         """
         Registeres a concrete state and all states related to it inside the state machine
@@ -408,7 +1703,7 @@ class StateMachineCrawler(object):
             self._register_state(state, False)
         for state in state_collection.related_states:
             self._register_state(state, False)
-        self._reload_graphs()
+        self._refresh_graphs()
 
     def register_module(self, module):
         """
@@ -421,19 +1716,73 @@ class StateMachineCrawler(object):
         """
         self.register_collection(StateCollection.from_module(module))
 
-    def _create_transition_dict(self, source, target, transition):
+    def _get_state_status(self, state):
+        return {
+            "current": state is self._current_state,
+            "next": state is self._next_state,
+            "visited": state in self._visited_states,
+            "failed": state in self._error_states
+        }
+
+    def _create_state_dict(self, state):
+        state_dict = {
+            "_entry": state,
+            "name": state.full_name,
+            "transitions": {}
+        }
+        state_dict.update(self._get_state_status(state))
+        return state_dict
+
+    def _get_transition_status(self, source, target):
         failed = (source, target) in self._error_transitions or source in self._error_states or \
             target in self._error_states
         return {
-            "_entry": transition,
             "current": self._current_state is source and self._next_state is target,
+            "visited": (source, target) in self._visited_transitions,
+            "failed": failed
+        }
+
+    def _create_transition_dict(self, source, target, transition):
+        transition_dict = {
+            "_entry": transition,
             "name": transition.original.__name__,
             "target": target.full_name,
             "source": source.full_name,
-            "cost": transition.cost,
-            "visited": (source, target) in self._visited_transitions,
-            "failed": failed
+            "cost": transition.cost
         }
+        transition_dict.update(self._get_transition_status(source, target))
+        return transition_dict
+
+    def _get_graph_model(self):
+        model = self._graph_model
+        if model is None or not model.matches(self):
+            model = self._graph_model = _GraphModel(self, model.version if model else 0)
+        model.sync()
+        return model
+
+    @property
+    def graph_version(self):
+        """ A number that grows every time the structure of the graph or the status of any state or transition
+        changes """
+        return self._get_graph_model().version
+
+    def get_graph_changes(self, version):
+        """
+        Returns the changes of the graph since the @version of :attr:`graph_version` as a dict with the keys:
+
+        - *version*: the current version of the graph
+        - *states*: a list of the state dicts of :meth:`as_graph` the status of which changed
+        - *transitions*: a list of the transition dicts of :meth:`as_graph` the status of which changed
+
+        Returns None if the structure of the graph changed since the @version or the @version is too old, in which case
+        the whole graph has to be fetched again via :meth:`as_graph`.
+        """
+        model = self._get_graph_model()
+        changes = model.get_changes(version)
+        if changes is None:
+            return None
+        version, states, transitions = changes
+        return {"version": version, "states": states, "transitions": transitions}
 
     def as_graph(self, include_entry_point=False):
         """
@@ -443,28 +1792,8 @@ class StateMachineCrawler(object):
             If True, the graph shall include the initial entry point and all related transitions.
             If False, the initial entry point and all related transitions are excluded from the graph
 
+        The graph is built once per registration and only the status flags of the states and transitions that changed
+        are updated on the subsequent calls. Every call returns a new copy of it that the caller is free to modify and
+        that doesn't change afterwards.
         """
-        states = {}
-
-        for state in self._state_graph:
-            states[state.full_name] = {
-                "_entry": state,
-                "name": state.full_name,
-                "current": state is self._current_state,
-                "next": state is self._next_state,
-                "visited": state in self._visited_states,
-                "failed": state in self._error_states,
-                "transitions": {}
-            }
-
-        for (source, target), transition in _create_transition_map(self._registered_states).iteritems():
-            states[source.full_name]["transitions"][target.full_name] = \
-                self._create_transition_dict(source, target, transition)
-
-        if include_entry_point:
-            for state_info in states.itervalues():
-                source = state_info["_entry"]
-                state_info["transitions"][self.EntryPoint.full_name] = \
-                    self._create_transition_dict(source, self.EntryPoint, self.EntryPoint._create_transition(source))
-
-        return states
+        return self._get_graph_model().copy_graph(include_entry_point)
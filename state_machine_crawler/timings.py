@@ -0,0 +1,145 @@
+import json
+import math
+import threading
+from collections import deque
+
+
+class _Stats(object):
+
+    def __init__(self, size, count=0, mean=0.0, samples=()):
+        self.count = count
+        self.mean = mean
+        self.samples = deque(samples, size)
+        self.cost = None
+
+    def add(self, duration):
+        self.count += 1
+        self.mean += (duration - self.mean) / self.count
+        self.samples.append(duration)
+
+    @property
+    def p95(self):
+        ordered = sorted(self.samples)
+        return ordered[int(math.ceil(0.95 * len(ordered))) - 1]
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p95": self.p95,
+            "samples": list(self.samples)
+        }
+
+
+class Timings(object):
+    """ Collects the durations of all transitions and verifications performed by the crawler
+
+    size (int=100)
+        number of the most recent durations kept per transition or state to estimate the 95th percentile
+
+    The statistics are identified by full names of the states, so that they can be stored and reused by another run:
+
+    >>> scm.timings.save("timings.json")
+    >>> scm.timings = Timings.load("timings.json")
+    >>> scm.timings.get_transition(StateOne, StateTwo)
+    {"count": 12, "mean": 0.8, "p95": 1.3, "samples": [...]}
+    """
+
+    def __init__(self, size=100):
+        self._size = size
+        self._transitions = {}
+        self._verifications = {}
+        self._restores = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        self._scale = None
+
+    def _add(self, stats, key, duration):
+        with self._lock:
+            if key not in stats:
+                stats[key] = _Stats(self._size)
+            stats[key].add(duration)
+            self._version += 1
+            return stats[key]
+
+    def add_transition(self, source, target, duration, cost):
+        """ Records a @duration of the transition between the @source and the @target with a static @cost """
+        self._add(self._transitions, (source.full_name, target.full_name), duration).cost = cost
+
+    def add_verification(self, state, duration):
+        """ Records a @duration of the verification of the @state """
+        self._add(self._verifications, state.full_name, duration)
+
+    def add_restore(self, state, duration):
+        """ Records a @duration of the restore of the snapshot of the @state """
+        self._add(self._restores, state.full_name, duration)
+
+    def get_transition(self, source, target):
+        """ Returns a dict with count, mean, p95 and the recent samples of the transition durations or None """
+        stats = self._transitions.get((source.full_name, target.full_name))
+        return stats and stats.as_dict()
+
+    def get_verification(self, state):
+        """ Returns a dict with count, mean, p95 and the recent samples of the verification durations or None """
+        stats = self._verifications.get(state.full_name)
+        return stats and stats.as_dict()
+
+    def _get_measured_cost(self, target_name, stats):
+        verification = self._verifications.get(target_name)
+        return stats.mean + (verification.mean if verification else 0)
+
+    def _get_scale(self):
+        """ Returns a number of seconds per unit of a static cost """
+        if self._scale is None or self._scale[0] != self._version:
+            measured = static = 0
+            for (_, target_name), stats in self._transitions.items():
+                if stats.cost:
+                    measured += self._get_measured_cost(target_name, stats)
+                    static += stats.cost
+            self._scale = self._version, (measured / static if static else 1)
+        return self._scale[1]
+
+    def get_cost(self, source, target, cost):
+        """ Returns the observed duration of the transition between the @source and the @target together with the
+        verification of the @target. If the transition was never measured its static @cost is converted to seconds
+        based on the transitions that were measured. """
+        stats = self._transitions.get((source.full_name, target.full_name))
+        if stats is None:
+            return cost * self._get_scale()
+        return self._get_measured_cost(target.full_name, stats)
+
+    def get_restore_cost(self, state, cost):
+        """ Same as :meth:`get_cost` but for a restore of the snapshot of the @state """
+        stats = self._restores.get(state.full_name)
+        if stats is None:
+            return cost * self._get_scale()
+        return self._get_measured_cost(state.full_name, stats)
+
+    def save(self, path):
+        """ Stores the statistics in a JSON file @path """
+        with self._lock:
+            data = {
+                "transitions": [dict(stats.as_dict(), source=source, target=target, cost=stats.cost)
+                                for (source, target), stats in self._transitions.items()],
+                "verifications": [dict(stats.as_dict(), state=state)
+                                  for state, stats in self._verifications.items()],
+                "restores": [dict(stats.as_dict(), state=state) for state, stats in self._restores.items()]
+            }
+        with open(path, "w") as fil:
+            json.dump(data, fil, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, path, size=100):
+        """ Restores the statistics from a JSON file @path created via :meth:`save` """
+        timings = cls(size)
+        with open(path) as fil:
+            data = json.load(fil)
+        for item in data["transitions"]:
+            stats = _Stats(size, item["count"], item["mean"], item["samples"])
+            stats.cost = item["cost"]
+            timings._transitions[item["source"], item["target"]] = stats
+        for item in data["verifications"]:
+            timings._verifications[item["state"]] = _Stats(size, item["count"], item["mean"], item["samples"])
+        for item in data.get("restores", []):
+            timings._restores[item["state"]] = _Stats(size, item["count"], item["mean"], item["samples"])
+        return timings
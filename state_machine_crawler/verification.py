@@ -0,0 +1,34 @@
+class Always(object):
+    """ Verifies every state the crawler goes through. This is the default policy. """
+
+    def __call__(self, state, final, hops, verified):
+        return True
+
+
+class FinalTarget(object):
+    """ Verifies only the state the crawler was asked to move to. Intermediate states of the path are trusted. """
+
+    def __call__(self, state, final, hops, verified):
+        return final
+
+
+class EveryNthHop(object):
+    """ Verifies the final target and every *n*-th state of the path
+
+    n (int)
+        maximal number of consecutive steps without verification plus one
+    """
+
+    def __init__(self, n):
+        self._n = n
+
+    def __call__(self, state, final, hops, verified):
+        return final or hops + 1 >= self._n
+
+
+class FirstVisit(object):
+    """ Verifies each state only the first time it is entered during the run (i.e. since the last
+    :meth:`clear <state_machine_crawler.StateMachineCrawler.clear>`) and the final target """
+
+    def __call__(self, state, final, hops, verified):
+        return final or state not in verified
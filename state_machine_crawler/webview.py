@@ -1,18 +1,23 @@
 import os
+import sys
+import json
+import uuid
+import zlib
+import time
 import mimetypes
 import urllib
 from functools import partial
 import threading
-import urllib2
 import socket
 import atexit
+from SocketServer import ThreadingMixIn
 from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
 
 from werkzeug.wrappers import Response, Request
 from werkzeug.routing import Map, Rule
 from werkzeug.wsgi import wrap_file
 
-from .serializers import svg, text, dot
+from .serializers import svg, text, dot, json_graph
 
 
 PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +30,31 @@ def _silent(call, *args):
         pass
 
 
+def _serialize_state_status(state):
+    color, text_color = dot.get_state_colors(state)
+    return {"id": dot.node_id(state["name"]), "color": color, "text_color": text_color}
+
+
+def _serialize_transition_status(transition):
+    color, text_color = dot.get_transition_colors(transition)
+    return {"id": "%s->%s" % (dot.node_id(transition["source"]), dot.node_id(transition["target"])),
+            "color": color, "text_color": text_color}
+
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _not_modified(request, etag):
+    """ Returns a 304 response if the client has the @etag version of the resource either compressed or not """
+    if request.if_none_match.contains(etag) or request.if_none_match.contains(etag + "-gzip"):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    return None
+
+
 class SilentHandler(WSGIRequestHandler):
 
     def log_message(self, *args, **kwargs):
@@ -35,11 +65,67 @@ class WSGIServerWithReusableSocket(WSGIServer):
     allow_reuse_address = True
 
 
+class ThreadedWSGIServer(ThreadingMixIn, WSGIServerWithReusableSocket):
+    daemon_threads = True
+
+
+class _Render(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Renderer(object):
+    """ Runs at most @workers renders at a time. Concurrent requests for the same key share one render and the result
+    is reused until a render with another version of the key is requested. """
+
+    def __init__(self, workers):
+        self._semaphore = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        # key -> (version, _Render)
+        self._renders = {}
+
+    def render(self, key, version, call):
+        with self._lock:
+            rendered_version, render = self._renders.get(key, (None, None))
+            owner = render is None or rendered_version != version
+            if owner:
+                render = _Render()
+                self._renders[key] = version, render
+
+        if owner:
+            try:
+                with self._semaphore:
+                    render.result = call()
+            except Exception:
+                render.error = sys.exc_info()
+                with self._lock:
+                    if self._renders.get(key, (None, None))[1] is render:
+                        del self._renders[key]
+            finally:
+                render.done.set()
+
+        render.done.wait()
+        if render.error:
+            raise render.error[0], render.error[1], render.error[2]
+        return render.result
+
+
 class WebView(object):
     """
 
     state_machine(:class:`StateMachineCrawler <state_machine_crawler.StateMachineCrawler>` instance)
         State machine to be monitored
+    port (int=8666)
+        Port to listen on. 0 picks a free one, see *port* attribute once the server is started
+    threaded (bool=True)
+        If True, every request is served in its own thread so that a slow render doesn't block the other clients.
+        Otherwise `/events` doesn't wait for the changes and the page polls it every *UNTHREADED_POLL_DELAY* seconds
+    render_workers (int=2)
+        How many graphs may be rendered at the same time. Concurrent requests for the same graph and the same version
+        of it share a single render
 
     Sample usage:
 
@@ -54,28 +140,60 @@ class WebView(object):
     >>> app.stop()
 
     Once the code is executed, a web service monitoring your state machine shall be started under
-    `http://localhost:8666 <http://localhost:8666>`_. The url shall be printed to stdout to ease the access.
+    `http://localhost:8666 <http://localhost:8666>`_ by default. The url shall be printed to stdout to ease the
+    access.
 
     An html page of the web service is a dynamic view of the graph that represents the state machine.
+
+    The page fetches the layout of the graph once and then long-polls `/events?version=N` for the states and the
+    transitions the status of which changed since the version *N* of the graph. The colors of those are patched in
+    place. The layout is fetched again only if the structure of the graph changes.
+
+    The graph is available as `/graph.svg`, `/graph.dot`, `/graph.txt` and `/graph.json`. The latter is a compact form
+    of :meth:`StateMachineCrawler.as_graph` that is sent only if the version of the graph differs from the one in the
+    *If-None-Match* header. The page lays out the graphs with more than 150 states itself out of `/graph.json` instead
+    of waiting for Graphviz; add `?renderer=client` or `?renderer=server` to the url to choose explicitly.
+
+    All the graphs and the static files have ETags derived from the graph version or the modification time of the file
+    and are gzipped for the clients that accept it, which matters when the crawler is monitored remotely.
     """
 
     HOST = 'localhost'
+    PORT = 8666
+
+    EVENTS_TIMEOUT = 5
+    EVENTS_POLL_INTERVAL = 0.1
+    # a single threaded server can't wait for the changes without blocking the other requests
+    UNTHREADED_POLL_DELAY = 1
+
+    # how long the browsers may use the static files without asking if they changed, the html page is always checked
+    STATIC_MAX_AGE = 3600
+
+    # responses of these types that are at least COMPRESS_MIN_SIZE bytes long are gzipped if the client accepts it
+    COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/dot", "image/svg+xml")
+    COMPRESS_MIN_SIZE = 1024
 
     SERIALIZER_MAP = {
         "svg": svg,
         "txt": text,
-        "dot": dot
+        "dot": dot,
+        "json": json_graph
     }
 
-    def __init__(self, state_machine):
+    def __init__(self, state_machine, port=PORT, threaded=True, render_workers=2):
         self._state_machine = state_machine
-        self._viewer_thread = threading.Thread(target=self._run_server)
+        self._viewer_thread = None
         self._alive = False
         self._server = None
+        self._threaded = threaded
+        self._renderer = _Renderer(render_workers)
+        # distinguishes the graph versions of different crawlers and runs in the ETags
+        self._instance_id = uuid.uuid4().hex[:8]
+        self.port = port
 
         url_map = [
             Rule("/", endpoint=partial(self._static, path="index.html")),
-            Rule("/kill", endpoint=None),
+            Rule("/events", endpoint=self._events),
             Rule("/graph.<string:serializer_type>", endpoint=self._graph),
             Rule("/<string:path>", endpoint=self._static)
         ]
@@ -86,8 +204,42 @@ class WebView(object):
 
         serializer_class = self.SERIALIZER_MAP.get(serializer_type, text).Serializer
 
-        resp = Response(repr(serializer_class(self._state_machine)))
-        resp.mimetype = serializer_class.mimetype
+        version = self._state_machine.graph_version
+        etag = "%s-%d" % (self._instance_id, version)
+
+        resp = _not_modified(request, etag)
+        if resp is None:
+            graph = self._renderer.render(serializer_class, version,
+                                          lambda: repr(serializer_class(self._state_machine)))
+            resp = Response(graph)
+            resp.mimetype = serializer_class.mimetype
+            resp.set_etag(etag)
+        resp.headers["X-Graph-Version"] = str(version)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+
+    def _events(self, request):
+        version = request.args.get("version", type=int, default=0)
+        deadline = time.time() + (self.EVENTS_TIMEOUT if self._threaded else 0)
+        while self._alive and self._state_machine.graph_version == version and time.time() < deadline:
+            time.sleep(self.EVENTS_POLL_INTERVAL)
+
+        changes = self._state_machine.get_graph_changes(version)
+        if changes is None:
+            data = {"version": self._state_machine.graph_version, "reload": True}
+        else:
+            data = {
+                "version": changes["version"],
+                "reload": False,
+                "states": [_serialize_state_status(state) for state in changes["states"]],
+                "transitions": [_serialize_transition_status(transition) for transition in changes["transitions"]]
+            }
+        # how long the client should wait before polling again
+        data["delay"] = 0 if self._threaded else self.UNTHREADED_POLL_DELAY
+
+        resp = Response(json.dumps(data))
+        resp.mimetype = "application/json"
+        resp.headers["Cache-Control"] = "no-cache"
         return resp
 
     def _static(self, request, path):
@@ -101,28 +253,61 @@ class WebView(object):
             resp.status_code = 404
             return resp
 
-        fil = open(abs_path)
-        resp.direct_passthrough = True
-        resp.response = wrap_file(request.environ, fil)
-
+        stat = os.stat(abs_path)
+        etag = "%x-%x" % (int(stat.st_mtime), stat.st_size)
         url = urllib.pathname2url(abs_path)
-        resp.mimetype = mimetypes.guess_type(url)[0]
+        mimetype = mimetypes.guess_type(url)[0]
+
+        resp = _not_modified(request, etag)
+        if resp is None:
+            resp = Response()
+            fil = open(abs_path)
+            resp.direct_passthrough = True
+            resp.response = wrap_file(request.environ, fil)
+            resp.mimetype = mimetype
+            resp.set_etag(etag)
+
+        if mimetype == "text/html":
+            resp.headers["Cache-Control"] = "no-cache"
+        else:
+            resp.headers["Cache-Control"] = "public, max-age=%d" % self.STATIC_MAX_AGE
 
         return resp
 
+    def _compress(self, request, resp):
+        resp.vary.add("Accept-Encoding")
+        if resp.status_code != 200 or request.accept_encodings["gzip"] <= 0 or \
+                not (resp.mimetype or "").startswith(self.COMPRESSIBLE_TYPES):
+            return resp
+        resp.direct_passthrough = False
+        data = resp.get_data()
+        if len(data) < self.COMPRESS_MIN_SIZE:
+            return resp
+        resp.set_data(_gzip(data))
+        resp.headers["Content-Encoding"] = "gzip"
+        etag, _ = resp.get_etag()
+        if etag:
+            resp.set_etag(etag + "-gzip")
+        return resp
+
     def __call__(self, environ, start_response):
         urls = self._url_map.bind_to_environ(environ)
         endpoint, params = urls.match()
-        if endpoint is None:
-            resp = Response("Killed")
-        else:
-            resp = endpoint(Request(environ), **params)
+        request = Request(environ)
+        resp = self._compress(request, endpoint(request, **params))
         return resp(environ, start_response)
 
     def _run_server(self):
-        self._server = httpd = make_server(self.HOST, 8666, self, server_class=WSGIServerWithReusableSocket,
+        print("Started the server at http://%s:%d" % (self.HOST, self.port))
+        self._server.serve_forever(poll_interval=0.1)
+
+    def start(self):
+        if self._alive:
+            return
+        server_class = ThreadedWSGIServer if self._threaded else WSGIServerWithReusableSocket
+        self._server = httpd = make_server(self.HOST, self.port, self, server_class=server_class,
                                            handler_class=SilentHandler)
-        print("Started the server at http://%s:%d" % (self.HOST, httpd.server_port))
+        self.port = httpd.server_port
 
         def close_socket():
             _silent(httpd.socket.shutdown, socket.SHUT_RDWR)
@@ -130,21 +315,14 @@ class WebView(object):
 
         atexit.register(close_socket)
 
-        while self._alive:
-            httpd.handle_request()
-
-    def start(self):
-        if self._alive:
-            return
         self._alive = True
+        self._viewer_thread = threading.Thread(target=self._run_server)
         self._viewer_thread.start()
 
     def stop(self):
         if not self._alive:
             return
         self._alive = False
-        try:
-            urllib2.urlopen("http://%s:%d/kill" % (self.HOST, self._server.server_port), timeout=3)
-        except socket.error:
-            pass
+        self._server.shutdown()
         self._viewer_thread.join()
+        self._server.server_close()
@@ -0,0 +1,73 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from state_machine_crawler import StateMachineCrawler, EventBus, JsonLinesWriter, RingBuffer, TransitionError, \
+    FinalTarget
+
+from .cases import InitialState, StateOne, StateFour
+from .utils import create_crawler
+
+
+class EventBusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "events.jsonl")
+        self.smc = create_crawler()
+        self.smc.events = EventBus()
+        self.ring = self.smc.events.subscribe(RingBuffer(4))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_step_events(self):
+        writer = self.smc.events.subscribe(JsonLinesWriter(self.path))
+        self.smc._system.unique.side_effect = [None, Exception("broken")]
+        self.assertRaises(TransitionError, self.smc.move, StateFour)
+        self.smc.events.close()
+        with open(self.path) as fil:
+            events = [json.loads(line) for line in fil]
+        self.assertEqual([event["event"] for event in events], [
+            EventBus.STEP_STARTED, EventBus.TRANSITION_OK, EventBus.VERIFICATION_OK,
+            EventBus.STEP_STARTED, EventBus.TRANSITION_OK, EventBus.VERIFICATION_OK,
+            EventBus.STEP_STARTED, EventBus.TRANSITION_FAILED, EventBus.STATES_UNREACHABLE])
+        self.assertEqual(events[0]["target"], InitialState.full_name)
+        self.assertIn("broken", events[-2]["error"])
+        self.assertIn(StateFour.full_name, events[-1]["states"])
+        self.assertEqual([event["event"] for event in self.ring.events], [
+            EventBus.VERIFICATION_OK, EventBus.STEP_STARTED, EventBus.TRANSITION_FAILED, EventBus.STATES_UNREACHABLE])
+        self.assertTrue(writer._file.closed)
+
+    def test_verification_events(self):
+        self.smc.verification_policy = FinalTarget()
+        self.smc._system.ok.side_effect = Exception("broken")
+        self.assertRaises(TransitionError, self.smc.move, StateOne)
+        self.smc.events.flush()
+        self.assertEqual([event["event"] for event in self.ring.events], [
+            EventBus.STEP_STARTED, EventBus.TRANSITION_OK, EventBus.VERIFICATION_FAILED, EventBus.STATES_UNREACHABLE])
+
+    def test_plan_events(self):
+        ring = self.smc.events.subscribe(RingBuffer(100))
+        self.smc.verify_all_states()
+        self.smc.events.flush()
+        plans = [event for event in ring.events if event["event"] == EventBus.PLAN_COMPUTED]
+        self.assertEqual(len(plans), 1)
+        self.assertEqual(plans[0]["steps"][0], StateMachineCrawler.EntryPoint.full_name)
+
+    def test_slow_subscriber(self):
+        release = threading.Event()
+        received = []
+        self.smc.events.subscribe(lambda event: release.wait())
+        self.smc.events.subscribe(lambda event: 1 / 0)
+        self.smc.events.subscribe(received.append)
+        self.smc.move(StateOne)
+        self.assertEqual(received, [])
+        release.set()
+        self.smc.events.flush()
+        self.assertEqual(len(received), 6)
+        self.smc.events.unsubscribe(self.ring)
+        self.smc.events.close()
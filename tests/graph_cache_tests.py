@@ -0,0 +1,142 @@
+import json
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from state_machine_crawler import StateMachineCrawler, UnreachableStateError, State, transition
+from state_machine_crawler.state_machine_crawler import _create_transition_map
+
+from .cases import ALL_STATES, InitialState, StateOne, StateTwo, StateFour, StateThreeVariantOne, StateThreeVariantTwo
+from .utils import create_crawler
+
+
+class GraphCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "graph.cache")
+        StateMachineCrawler.graph_cache_path = self.path
+
+    def tearDown(self):
+        StateMachineCrawler.graph_cache_path = None
+        sys.modules.pop("extra_states", None)
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        smc = create_crawler()
+        smc.move(StateFour)
+        smc.save_graph_cache()
+        with open(self.path) as fil:
+            data = json.load(fil)
+        self.assertEqual(data["key"], smc._graph_key)
+        self.assertIn(str(data["states"].index(smc.EntryPoint.full_name)), data["paths"])
+
+        scanned = []
+
+        def create_transition_map(states, names=None):
+            scanned.append(len(states))
+            return _create_transition_map(states, names)
+
+        with mock.patch("state_machine_crawler.state_machine_crawler._create_transition_map", create_transition_map):
+            other = create_crawler()
+        # only the initial state registered by the constructor is scanned
+        self.assertLess(max(scanned), len(other._registered_states))
+        self.assertFalse(other._graph_cache_dirty)
+        self.assertEqual(dict(other._state_graph.iteritems()), dict(smc._state_graph.iteritems()))
+        self.assertEqual(set(other._transition_map), set(smc._transition_map))
+        self.assertEqual(other._transition_names, smc._transition_names)
+        self.assertEqual(other._path_trees[other.EntryPoint], smc._path_trees[smc.EntryPoint])
+
+        with mock.patch("state_machine_crawler.state_machine_crawler._iter_cheapest") as iter_cheapest:
+            other.move(StateFour)
+        self.assertFalse(iter_cheapest.called)
+        self.assertIs(other._current_state, StateFour)
+
+        mtime = os.path.getmtime(self.path)
+        other.save_graph_cache()  # nothing new to store
+        self.assertEqual(os.path.getmtime(self.path), mtime)
+
+    def _import_extra_state(self, cost):
+        with open(os.path.join(self.directory, "extra_states.py"), "w") as fil:
+            fil.write("from state_machine_crawler import State, transition\n"
+                      "from tests.cases import StateFour\n\n\n"
+                      "class ExtraState(State):\n\n"
+                      "    @transition(source_state=StateFour, cost=%d)\n"
+                      "    def move(self):\n"
+                      "        pass\n\n"
+                      "    def verify(self):\n"
+                      "        pass\n" % cost)
+        sys.modules.pop("extra_states", None)
+        sys.path.insert(0, self.directory)
+        try:
+            return __import__("extra_states").ExtraState
+        finally:
+            sys.path.remove(self.directory)
+
+    def test_stale_key(self):
+        smc = create_crawler(states=ALL_STATES + [self._import_extra_state(1)])
+        smc.save_graph_cache()
+        extra_state = self._import_extra_state(20)
+        other = create_crawler(states=ALL_STATES + [extra_state])
+        self.assertNotEqual(other._graph_key, smc._graph_key)
+        self.assertEqual(other._path_trees, {})
+        self.assertEqual(other._transition_map[StateFour, extra_state].cost, 20)
+
+    def test_changed_edges(self):
+
+        class Shortcut(State):
+
+            @transition(source_state=InitialState)
+            def move(self):
+                pass
+
+            def verify(self):
+                pass
+
+        smc = create_crawler()
+        smc.move(StateFour)
+        smc.save_graph_cache()
+
+        # the same names of the states but one of them is connected differently
+        Shortcut.full_name = StateOne.full_name
+        other = create_crawler(states=[state for state in ALL_STATES if state is not StateOne] + [Shortcut])
+        self.assertNotEqual(other._graph_key, smc._graph_key)
+        self.assertEqual(other._path_trees, {})
+
+    def test_broken_file(self):
+        with open(self.path, "w") as fil:
+            fil.write("{")
+        smc = create_crawler()
+        smc.move(StateOne)
+        self.assertIs(smc._current_state, StateOne)
+
+    def test_disabled(self):
+        StateMachineCrawler.graph_cache_path = None
+        smc = create_crawler()
+        self.assertIs(smc._graph_key, None)
+        smc.save_graph_cache()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_no_source_file(self):
+        with mock.patch.object(StateOne, "__module__", "generated"):
+            self.assertIs(create_crawler()._graph_key, None)
+        with mock.patch.dict(sys.modules, {"generated": mock.Mock(__file__=os.path.join(self.directory, "gone.py"))}):
+            with mock.patch.object(StateOne, "__module__", "generated"):
+                self.assertIs(create_crawler()._graph_key, None)
+
+    def test_failures_bypass_path_trees(self):
+        smc = create_crawler()
+        smc._error_states.add(StateThreeVariantOne)
+        smc._error_states.add(StateThreeVariantTwo)
+        self.assertRaises(UnreachableStateError, smc.move, StateFour)
+        self.assertEqual(smc._path_trees, {})
+
+    def test_unreachable_target(self):
+        smc = create_crawler()
+        smc.move(StateTwo)
+        smc._get_path_tree(StateTwo).pop(StateFour)
+        self.assertRaises(UnreachableStateError, smc.move, StateFour)
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from state_machine_crawler import StateMachineCrawler, Journal, TransitionError, Snapshots
+
+from .cases import InitialState, UnknownState, StateOne, StateTwo, StateThreeVariantOne, StateFour
+from .utils import create_crawler
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "crawl.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_records(self):
+        target = mock.Mock()
+        target.last_verify.side_effect = Exception("broken")
+        smc = create_crawler(target)
+        smc.journal = Journal(self.path)
+        self.assertRaises(TransitionError, smc.move, StateFour)
+        smc.journal.close()
+        with open(self.path, "a") as fil:
+            fil.write('{"source": "trunca')
+        records = list(Journal.read(self.path))
+        self.assertEqual([record["outcome"] for record in records],
+                         [Journal.OK] * 4 + [Journal.VERIFICATION_FAILURE])
+        self.assertEqual(records[1]["source"], InitialState.full_name)
+        self.assertEqual(records[1]["target"], StateOne.full_name)
+        self.assertIs(records[1]["error"], None)
+        self.assertIn("broken", records[-1]["error"])
+
+    def test_resume(self):
+        target = mock.Mock()
+        restore = mock.Mock()
+        smc = create_crawler(target)
+        smc.journal = Journal(self.path)
+        smc.snapshots = Snapshots(mock.Mock(), restore)
+        smc.move(StateTwo)
+        smc.move(StateMachineCrawler.EntryPoint)
+        smc.move(StateTwo)
+        target.last_verify.side_effect = Exception
+        self.assertRaises(TransitionError, smc.move, StateFour)
+        restore.side_effect = Exception
+        self.assertRaises(TransitionError, smc.move, StateTwo)
+        restore.side_effect = None
+        target.non_unique.side_effect = Exception
+        self.assertRaises(TransitionError, smc.move, StateThreeVariantOne)
+        smc.journal.record(UnknownState, StateOne, Journal.OK, False, 1.0, 1.0)
+        smc.journal.record(StateOne, StateFour, Journal.OK, False, 1.0, 1.0)
+        smc.journal.close()
+
+        resumed = create_crawler(mock.Mock())
+        resumed.resume(self.path)
+        self.assertEqual(resumed._visited_states, smc._visited_states)
+        self.assertEqual(resumed._error_states, smc._error_states)
+        self.assertEqual(resumed._visited_transitions, smc._visited_transitions)
+        self.assertEqual(resumed._error_transitions, smc._error_transitions)
+        self.assertEqual(resumed.timings.get_transition(StateOne, StateTwo)["count"], 2)
+        self.assertEqual(resumed.timings._restores[StateTwo.full_name].count, 1)
+        self.assertIs(resumed.state, StateMachineCrawler.EntryPoint)
+
+    def test_truncate(self):
+        journal = Journal(self.path)
+        journal.record(StateOne, StateTwo, Journal.OK, False, 1.0, 1.0)
+        journal.close()
+        journal = Journal(self.path, append=False)
+        journal.record(StateTwo, StateFour, Journal.OK, False, 1.0, 1.0)
+        journal.close()
+        self.assertEqual([record["source"] for record in Journal.read(self.path)], [StateTwo.full_name])
+
+    def test_closed_journal(self):
+        target = mock.Mock()
+        smc = create_crawler(target)
+        smc.journal = Journal(self.path)
+        smc.move(StateOne)
+        smc.journal.close()
+        self.assertRaises(ValueError, smc.move, StateTwo)
+        self.assertIs(smc.state, StateTwo)
+        self.assertIs(smc._next_state, None)
+        self.assertIn(StateTwo, smc._visited_states)
+        self.assertNotIn(StateTwo, smc._error_states)
+
+        target.non_unique.side_effect = Exception
+        self.assertRaises(ValueError, smc.move, StateThreeVariantOne)
+        self.assertIs(smc.state, StateMachineCrawler.EntryPoint)
+        self.assertIn(StateThreeVariantOne, smc._error_states)
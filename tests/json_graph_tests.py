@@ -0,0 +1,40 @@
+import json
+import unittest
+
+from state_machine_crawler import State, transition
+from state_machine_crawler.serializers.json_graph import Serializer
+
+from .cases import ALL_STATES, InitialState
+from .utils import create_crawler
+
+
+class _Hidden(State):
+
+    def verify(self):
+        pass
+
+
+class ToHidden(State):
+
+    @transition(source_state=InitialState)
+    def move(self):
+        pass
+
+    @transition(target_state=_Hidden)
+    def hide(self):
+        pass
+
+    def verify(self):
+        pass
+
+
+class JsonGraphSerializerTest(unittest.TestCase):
+
+    def test_transition_to_hidden_state(self):
+        smc = create_crawler(states=ALL_STATES + [ToHidden])
+        graph = json.loads(repr(Serializer(smc)))
+        names = [state["name"] for state in graph["states"]]
+        self.assertNotIn(_Hidden.full_name, names)
+        self.assertIn(ToHidden.full_name, names)
+        self.assertEqual([item for item in graph["transitions"] if names[item["source"]] == ToHidden.full_name], [])
+        self.assertTrue(graph["transitions"])
@@ -0,0 +1,60 @@
+import unittest
+
+import mock
+
+from state_machine_crawler import StateMachineCrawler, ParallelCrawler, TransitionError, UnreachableStateError
+
+from .cases import ALL_STATES, InitialState, StateOne, StateFour
+from .utils import create_crawler
+
+
+class ParallelCrawlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.smc = create_crawler()
+        self.systems = [mock.Mock(), mock.Mock(), mock.Mock()]
+
+    def _visited(self):
+        visited = []
+        for system in self.systems:
+            visited.extend(item[0][0] for item in system.visited.call_args_list)
+        return visited
+
+    def test_all_states(self):
+        ParallelCrawler(self.smc, self.systems).verify_all_states()
+        self.assertEqual(set(self._visited()), set(state.__name__ for state in ALL_STATES))
+        self.assertEqual(self.smc._visited_states, set(ALL_STATES) | {StateMachineCrawler.EntryPoint})
+        self.assertIs(self.smc.state, StateMachineCrawler.EntryPoint)
+
+    def test_full(self):
+        ParallelCrawler(self.smc, self.systems).verify_all_states(full=True)
+        self.assertEqual(self.smc._get_unexecuted_transitions(), set())
+
+    def test_factory(self):
+        crawler = ParallelCrawler(self.smc, mock.Mock, workers=2)
+        self.assertEqual(len(crawler._crawlers), 2)
+        crawler.verify_all_states(".*StateOne")
+        self.assertEqual(self.smc._visited_states,
+                         {StateMachineCrawler.EntryPoint, InitialState, StateOne})
+
+    def test_failure(self):
+        for system in self.systems:
+            system.last_verify.side_effect = Exception
+        self.assertRaisesRegexp(TransitionError, "Failed to visit the following states: %s" % StateFour,
+                                ParallelCrawler(self.smc, self.systems).verify_all_states, full=True)
+        self.assertEqual(self.smc._error_states, {StateFour})
+
+    def test_failure_with_path_table(self):
+        self.smc.use_path_table()
+        for system in self.systems:
+            system.last_verify.side_effect = Exception
+        self.assertRaises(TransitionError, ParallelCrawler(self.smc, self.systems).verify_all_states)
+        self.assertRaises(UnreachableStateError, self.smc.move, StateFour)
+
+    def test_unexpected_error(self):
+        for system in self.systems:
+            system.enter.side_effect = Exception
+        crawler = ParallelCrawler(self.smc, self.systems)
+        for worker in crawler._crawlers:
+            worker.log.err = mock.Mock(side_effect=ValueError)
+        self.assertRaises(ValueError, crawler.verify_all_states)
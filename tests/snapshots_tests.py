@@ -0,0 +1,104 @@
+import unittest
+
+import mock
+
+from state_machine_crawler import StateMachineCrawler, Snapshots, TransitionError, ParallelCrawler
+
+from .cases import UnknownState, ALL_STATES, InitialState, StateOne, StateTwo, StateThreeVariantTwo, StateFour
+from .utils import create_crawler
+
+
+class SnapshotsTest(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        release = mock.Mock()
+        snapshots = Snapshots(lambda system: system.pop(0), None, capacity=2, release=release)
+        system = ["one", "two", "three"]
+        snapshots.take(StateOne, system)
+        snapshots.take(StateTwo, system)
+        snapshots.take(StateOne, system)
+        snapshots.create_transition(StateOne)
+        snapshots.take(StateFour, system)
+        self.assertEqual(list(snapshots), [StateOne, StateFour])
+        release.assert_called_once_with("two")
+
+    def test_size_budget(self):
+        snapshots = Snapshots(lambda system: system.pop(0), None, max_size=5, get_size=len)
+        system = ["abc", "de", "f"]
+        snapshots.take(StateOne, system)
+        snapshots.take(StateTwo, system)
+        self.assertEqual(len(snapshots), 2)
+        snapshots.take(StateFour, system)
+        self.assertEqual(list(snapshots), [StateTwo, StateFour])
+        snapshots.discard(StateOne)
+        snapshots.discard(StateTwo)
+        self.assertEqual(snapshots._size, 1)
+
+
+class CrawlerWithSnapshotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.target = mock.Mock()
+        self.smc = create_crawler(self.target)
+        self.restore = mock.Mock()
+        self.smc.snapshots = Snapshots(lambda system: system.checkpoint(), self.restore, capacity=2)
+        self.target.checkpoint.side_effect = lambda: len(self.target.checkpoint.call_args_list)
+
+    def test_restore_instead_of_replay(self):
+        self.smc.move(StateFour)
+        self.assertEqual(list(self.smc.snapshots), [StateThreeVariantTwo, StateFour])
+        self.smc.move(StateMachineCrawler.EntryPoint)
+        self.smc.move(StateFour)
+        self.assertIs(self.smc.state, StateFour)
+        self.assertEqual(self.target.enter.call_count, 1)
+        self.restore.assert_called_once_with(self.target, 5)
+        self.assertEqual(self.smc.timings._restores[StateFour.full_name].count, 1)
+
+    def test_restore_failure(self):
+        self.smc.move(StateFour)
+        self.smc.move(StateMachineCrawler.EntryPoint)
+        self.restore.side_effect = Exception
+        self.assertRaisesRegexp(TransitionError, "snapshot restore failure", self.smc.move, StateFour)
+        self.assertNotIn(StateFour, self.smc.snapshots)
+        self.assertEqual(self.smc._error_states, set())
+        self.restore.side_effect = None
+        self.smc.move(StateFour)
+        self.assertEqual(self.restore.call_count, 2)
+        self.assertEqual(self.target.enter.call_count, 1)
+        self.assertIn(StateFour, self.smc.snapshots)
+
+    def test_evicted_snapshot_is_replanned(self):
+        self.smc.snapshots = Snapshots(lambda system: system.checkpoint(), self.restore, capacity=2, cost=0)
+        self.smc.move(StateOne)
+        self.smc.clear()
+        self.smc.verify_all_states()
+        self.assertEqual(self.smc._error_states, set())
+        self.assertTrue(set(ALL_STATES).issubset(self.smc._visited_states | {UnknownState}))
+
+    def test_take_failure(self):
+        self.target.checkpoint.side_effect = IOError
+        self.smc.move(StateFour)
+        self.assertIs(self.smc.state, StateFour)
+        self.assertEqual(self.smc._error_states, set())
+        self.assertEqual(len(self.smc.snapshots), 0)
+
+    def test_shortcut_graph(self):
+        self.smc.move(StateTwo)
+        graph = self.smc._get_reachable_graph()
+        self.assertEqual(graph[StateMachineCrawler.EntryPoint], {InitialState, StateOne, StateTwo})
+        self.assertIs(graph.get(UnknownState), None)
+
+    def test_measured_restore_cost(self):
+        self.smc.use_measured_costs()
+        self.assertEqual(self.smc._get_transition_cost(StateMachineCrawler.EntryPoint, StateFour), 1)
+        self.smc.timings.add_restore(StateFour, 7.0)
+        self.assertEqual(self.smc._get_transition_cost(StateMachineCrawler.EntryPoint, StateFour), 7.0)
+
+    def test_parallel_crawlers_keep_own_snapshots(self):
+        systems = [mock.Mock(), mock.Mock()]
+        crawler = ParallelCrawler(self.smc, systems)
+        first, second = [worker.snapshots for worker in crawler._crawlers]
+        self.assertIsNot(first, second)
+        self.assertIsNot(first, self.smc.snapshots)
+        crawler.verify_all_states(full=True)
+        self.assertEqual(self.smc._get_unexecuted_transitions(), set())
@@ -1,3 +1,4 @@
+import random
 import unittest
 
 import mock
@@ -5,7 +6,10 @@ import mock
 from state_machine_crawler import transition, StateMachineCrawler, DeclarationError, TransitionError, \
     State as BaseState, WebView, UnreachableStateError, NonExistentStateError, MultipleStatesError, StateCollection
 from state_machine_crawler.state_machine_crawler import _create_state_map, _find_shortest_path, \
-    _create_state_map_with_exclusions, _get_missing_nodes, _dfs, _create_transition_map
+    _create_state_map_with_exclusions, _get_missing_nodes, _dfs, _create_transition_map, \
+    _get_reachable_nodes, _Reachability, _PathTable, _CompactGraph, \
+    _plan_transition_coverage, _get_naive_coverage_cost, \
+    _improve_tour, _plan_state_tour, _get_naive_tour_cost, _unit_cost, _get_path_cost, _iter_cheapest
 
 from .cases import ALL_STATES, InitialState, StateOne, StateTwo, StateThreeVariantOne, StateThreeVariantTwo, \
     StateFour, EXEC_TIME, UnknownState, State
@@ -72,21 +76,87 @@ class BaseFunctionsTest(unittest.TestCase):
                          filtered_graph)
         self.assertEqual(_get_missing_nodes(graph, filtered_graph, 0), {1, 3, 4, 5, 9})
 
+    def test_get_reachable_nodes(self):
+        graph = {
+            0: {1, 2},
+            1: {0, 3},
+            4: {0, 5}
+        }
+        self.assertEqual(_get_reachable_nodes(graph, 0), {0, 1, 2, 3})
+        self.assertEqual(_get_reachable_nodes(graph, 4), {0, 1, 2, 3, 4, 5})
+
     def test_find_shortest_path(self):
         graph = _create_state_map(ALL_STATES)
         transitions = _create_transition_map(graph)
 
-        def get_cost(states):
-            cost = 0
-            cursor = states[0]
-            for state in states[1:]:
-                cost += transitions[cursor, state].cost
-                cursor = state
-            return cost
+        def get_cost(source, target):
+            return transitions[source, target].cost
 
         shortest_path = _find_shortest_path(graph, InitialState, StateFour, get_cost=get_cost)
         self.assertEqual(shortest_path, [InitialState, StateOne, StateTwo, StateThreeVariantTwo, StateFour])
 
+    def test_find_cheapest_path(self):
+        graph = {0: {1, 3}, 1: {2, 3}, 2: {4}, 3: {4}, 4: set(), 5: {0}}
+        costs = {(0, 3): 5, (1, 3): 3}
+
+        def get_cost(source, target):
+            return costs.get((source, target), 1)
+
+        self.assertEqual(_find_shortest_path(graph, 0, 4), [0, 3, 4])
+        self.assertEqual(_find_shortest_path(graph, 0, 4, get_cost=get_cost), [0, 1, 2, 4])
+        self.assertIs(_find_shortest_path(graph, 0, 5, get_cost=get_cost), None)
+
+    def test_plan_transition_coverage(self):
+        graph = {
+            "E": {"A"},
+            "A": {"B", "C", "E"},
+            "B": {"A", "E"},
+            "C": {"D", "E"},
+            "D": {"A", "E"},
+            "X": {"A"}
+        }
+        costs = {("E", "A"): 5, ("A", "E"): 0, ("B", "E"): 0, ("C", "E"): 0, ("D", "E"): 0}
+
+        def get_cost(source, target):
+            return costs.get((source, target), 1)
+
+        transitions = [("A", "B"), ("A", "C"), ("C", "D"), ("B", "A"), ("D", "A"), ("X", "A")]
+        walk = _plan_transition_coverage(graph, "E", transitions, get_cost)
+        self.assertEqual(walk[0], "E")
+        covered = set(zip(walk, walk[1:]))
+        self.assertTrue(set(transitions[:-1]).issubset(covered))
+        self.assertNotIn(("X", "A"), covered)
+        cost = sum(get_cost(source, target) for source, target in zip(walk, walk[1:]))
+        self.assertEqual(cost, 10)
+        self.assertEqual(_get_naive_coverage_cost(graph, "E", transitions, get_cost), 15)
+
+    def test_improve_tour(self):
+
+        def get_distance(source, target):
+            return abs(source - target)
+
+        self.assertEqual(_improve_tour([0, 1, -2, 3], get_distance), [0, -2, 1, 3])
+        self.assertEqual(_improve_tour([0, -2, 1, 3], get_distance), [0, -2, 1, 3])
+
+        nodes = range(1, 40)
+        random.Random(0).shuffle(nodes)
+        self.assertEqual(_improve_tour([0] + nodes, get_distance), range(40))
+
+    def test_plan_state_tour(self):
+        graph = {
+            0: {1, -1},
+            1: {0, 2},
+            2: {1, 3},
+            3: {2},
+            -1: {0, -2},
+            -2: {-1},
+            4: {0}
+        }
+        walk = _plan_state_tour(graph, 0, {3, -2, 4}, _unit_cost)
+        self.assertEqual(walk, [0, -1, -2, -1, 0, 1, 2, 3])
+        self.assertEqual(_get_naive_tour_cost(graph, 0, {3, -2, 4}, _unit_cost), 8)
+        self.assertEqual(_get_naive_tour_cost({0: {1, 2}, 1: set(), 2: set()}, 0, {1, 2}, _unit_cost), 1)
+
     def test_unknown_state(self):
         graph = _create_state_map(ALL_STATES)
         shortest_path = _find_shortest_path(graph, UnknownState, StateFour)
@@ -102,6 +172,219 @@ class BaseFunctionsTest(unittest.TestCase):
                  "G": ["C", "A"]}
         self.assertEqual(_dfs(graph, "A"), ['A', 'C', 'G', 'F', 'B', 'E', 'D'])
 
+    def test_long_chain(self):
+        size = 10000
+        graph = dict((node, {node + 1}) for node in range(size))
+        self.assertEqual(_dfs(graph, 0), range(size + 1))
+        sub_graph = _create_state_map_with_exclusions(graph, 0, [size / 2])
+        self.assertEqual(len(sub_graph), size / 2)
+        self.assertEqual(_get_missing_nodes(graph, sub_graph, 0), set(range(size / 2, size + 1)))
+        self.assertEqual(_create_state_map_with_exclusions(graph, 0, [0]), {})
+
+
+class ReachabilityTest(unittest.TestCase):
+
+    def test_cycle_without_support_is_lost(self):
+        graph = {
+            0: {1, 4},
+            1: {2},
+            2: {3},
+            3: {2, 0},
+            4: {3}
+        }
+        reachability = _Reachability(graph, 0)
+        self.assertEqual(reachability.fail_edge(0, 4), {4})
+        self.assertEqual(reachability.fail_edge(0, 4), set())
+        self.assertEqual(reachability.fail_node(1), {1, 2, 3})
+        self.assertEqual(reachability.fail_node(1), set())
+        self.assertEqual(reachability.fail_node(2), set())
+        self.assertEqual(reachability.fail_edge(2, 3), set())
+        self.assertEqual(reachability.reachable, {0})
+
+    def test_matches_full_recalculation(self):
+        rand = random.Random(42)
+        for _ in range(50):
+            graph = {}
+            for node in range(15):
+                graph[node] = set(rand.sample(range(15), 3)) | {0}
+            reachability = _Reachability(graph, 0)
+            failed_states = set()
+            failed_transitions = set()
+            unreachable = set()
+            for _ in range(6):
+                if rand.random() < 0.5:
+                    node = rand.randrange(1, 15)
+                    failed_states.add(node)
+                    unreachable.update(reachability.fail_node(node))
+                else:
+                    edge = (rand.randrange(15), rand.randrange(1, 15))
+                    failed_transitions.add(edge)
+                    unreachable.update(reachability.fail_edge(*edge))
+                sub_graph = _create_state_map_with_exclusions(graph, 0, failed_states, failed_transitions)
+                self.assertEqual(unreachable, _get_missing_nodes(graph, sub_graph, 0))
+
+
+class CompactGraphTest(unittest.TestCase):
+
+    def test_dict_interface(self):
+        graph = {
+            0: {1, 2},
+            1: {3},
+            2: set()
+        }
+        compact = _CompactGraph(graph, lambda source, target: source + target)
+        self.assertEqual(len(compact), 3)
+        self.assertEqual(dict(compact.iteritems()), graph)
+        self.assertNotIn(3, compact)
+        self.assertRaises(KeyError, compact.__getitem__, 3)
+        self.assertEqual(compact.get(3, ()), ())
+        self.assertEqual(list(compact.costs[compact.offsets[compact.index[1]]:]), [4])
+        self.assertEqual(_find_shortest_path(compact, 0, 3), [0, 1, 3])
+        self.assertEqual(_find_shortest_path(compact, 3, 0), None)
+        self.assertEqual(list(_iter_cheapest(compact, 3, {})), [(0, 3)])
+
+    def test_duplicate_children(self):
+        compact = _CompactGraph({0: [1, 2, 1], 1: [], 3: [0, 0]})
+        self.assertEqual(dict(compact.iteritems()), {0: {1, 2}, 1: set(), 3: {0}})
+        self.assertEqual(sorted(compact.iteredges()), [(0, 1), (0, 2), (3, 0)])
+        self.assertEqual(_get_reachable_nodes(compact, 3), {0, 1, 2, 3})
+        self.assertEqual(_get_reachable_nodes(compact, 2), {2})
+
+    def test_own_costs(self):
+        get_cost = mock.Mock(side_effect=lambda source, target: 10 - target)
+        compact = _CompactGraph({0: [1, 2], 1: [2], 2: []}, get_cost)
+        self.assertEqual(get_cost.call_count, 3)
+        self.assertEqual(list(_iter_cheapest(compact, 0, {}, get_cost)), [(0, 0), (8, 2), (9, 1)])
+        self.assertEqual(get_cost.call_count, 3)
+        self.assertEqual(list(_iter_cheapest(compact, 0, {})), [(0, 0), (1, 1), (1, 2)])
+
+    def test_matches_dict_graph(self):
+        rand = random.Random(3)
+        for _ in range(20):
+            graph = {}
+            for node in range(12):
+                graph[node] = set(rand.sample(range(14), 3))
+            costs = dict(((node, child), rand.randint(1, 5)) for node in graph for child in graph[node])
+
+            def get_cost(source, target):
+                return costs[source, target]
+
+            compact = _CompactGraph(graph, get_cost)
+            excluded_nodes = set(rand.sample(range(14), 2))
+            excluded_edges = set(rand.sample(sorted(costs), 3)) | {(0, 20)}
+            expected = _create_state_map_with_exclusions(graph, 0, excluded_nodes, excluded_edges)
+            view = _create_state_map_with_exclusions(compact, 0, excluded_nodes, excluded_edges)
+            self.assertEqual(dict(view.iteritems()), expected)
+            self.assertEqual(len(view), len(expected))
+            self.assertEqual(sorted(view.iteredges()),
+                             sorted((node, child) for node in expected for child in expected[node]))
+            for start in range(14):
+                self.assertEqual(_get_reachable_nodes(view, start), _get_reachable_nodes(expected, start))
+                self.assertEqual(_get_reachable_nodes(compact, start), _get_reachable_nodes(graph, start))
+                for sub_graph, dict_graph in ((compact, graph), (view, expected)):
+                    self.assertEqual(sorted(cost for cost, _ in _iter_cheapest(sub_graph, start, {}, get_cost)),
+                                     sorted(cost for cost, _ in _iter_cheapest(dict_graph, start, {}, get_cost)))
+                    for end in range(14):
+                        path = _find_shortest_path(sub_graph, start, end, get_cost)
+                        expected_path = _find_shortest_path(dict_graph, start, end, get_cost)
+                        if expected_path is None:
+                            self.assertIs(path, None)
+                        else:
+                            self.assertEqual(_get_path_cost(path, get_cost), _get_path_cost(expected_path, get_cost))
+        self.assertEqual(len(_create_state_map_with_exclusions(compact, 0, [0])), 0)
+
+
+class PathTableTest(unittest.TestCase):
+
+    def test_failures(self):
+        graph = {
+            0: {1, 2},
+            1: {3},
+            2: {3},
+            3: {0}
+        }
+        table = _PathTable(_CompactGraph(graph, lambda source, target: 1 if source == 1 else 2))
+        self.assertEqual(table.get_path(0, 3), [0, 1, 3])
+        self.assertEqual(table.get_path(2, 2), [2])
+        self.assertEqual(table.get_path(0, 5), None)
+        table.fail_edge(0, 1)
+        table.fail_edge(0, 1)
+        table.fail_edge(0, 5)
+        self.assertEqual(table.get_path(0, 3), [0, 2, 3])
+        self.assertEqual(table.get_path(1, 0), [1, 3, 0])
+        table.fail_node(2)
+        table.fail_node(2)
+        table.fail_node(5)
+        self.assertEqual(table.get_path(0, 3), None)
+        self.assertEqual(table.get_path(2, 3), None)
+
+    def test_clear_failures(self):
+        graph = {
+            0: {1, 2},
+            1: {3},
+            2: {3},
+            3: {0}
+        }
+        table = _PathTable(_CompactGraph(graph, lambda source, target: 1 if source == 1 else 2))
+        self.assertEqual(table._rows, {})
+        self.assertEqual(table.get_path(0, 3), [0, 1, 3])
+        clean_row = table._rows[3]
+        self.assertEqual(table.get_path(3, 1), [3, 0, 1])
+        self.assertEqual(sorted(table._rows), [1, 3])
+
+        fork = table.copy()
+        fork.fail_edge(0, 1)
+        self.assertEqual(fork.get_path(0, 3), [0, 2, 3])
+        self.assertEqual(table.get_path(0, 3), [0, 1, 3])
+
+        table.fail_node(2)
+        table.clear_failures()
+        self.assertEqual(sorted(table._rows), [1, 3])
+        self.assertIs(table._rows[3], clean_row)
+        table.clear_failures()
+
+        table.fail_node(1)
+        self.assertEqual(table.get_path(0, 3), [0, 2, 3])
+        self.assertEqual(table.get_path(3, 2), [3, 0, 2])
+        table.clear_failures()
+        self.assertEqual(table._rows, {})
+        self.assertEqual(table.get_path(0, 3), [0, 1, 3])
+
+    def test_matches_dijkstra(self):
+        rand = random.Random(7)
+        for _ in range(20):
+            graph = {}
+            for node in range(12):
+                graph[node] = set(rand.sample(range(12), 3))
+            costs = dict(((node, child), rand.randint(1, 5)) for node in graph for child in graph[node])
+
+            def get_cost(source, target):
+                return costs[source, target]
+
+            table = _PathTable(_CompactGraph(graph, get_cost))
+            failed_states = set()
+            failed_transitions = set()
+            for _ in range(4):
+                if rand.random() < 0.5:
+                    node = rand.randrange(12)
+                    failed_states.add(node)
+                    table.fail_node(node)
+                else:
+                    edge = rand.choice(sorted(costs))
+                    failed_transitions.add(edge)
+                    table.fail_edge(*edge)
+                sub_graph = dict((node, set(child for child in children if child not in failed_states and
+                                            (node, child) not in failed_transitions))
+                                 for node, children in graph.iteritems() if node not in failed_states)
+                for start in range(12):
+                    for end in range(12):
+                        path = table.get_path(start, end)
+                        expected = _find_shortest_path(sub_graph, start, end, get_cost)
+                        if expected is None:
+                            self.assertIs(path, None)
+                        else:
+                            self.assertEqual(_get_path_cost(path, get_cost), _get_path_cost(expected, get_cost))
+
 
 class BaseTestStateMachineTransitionCase(unittest.TestCase):
 
@@ -159,6 +442,25 @@ class PositiveTestStateMachineTransitionTest(BaseTestStateMachineTransitionCase)
                          set(['StateTwo', 'StateThreeVariantOne', 'StateFour', 'InitialState', 'StateOne',
                               'StateThreeVariantTwo']))
 
+    def test_plan_transitions(self):
+        self.smc.move(StateOne)
+        plan = self.smc.plan_transitions()
+        self.assertIs(plan.steps[0], StateOne)
+        covered = set(zip(plan.steps, plan.steps[1:]))
+        for source, targets in self.smc._state_graph.iteritems():
+            for target in targets:
+                if target is not StateMachineCrawler.EntryPoint:
+                    self.assertIn((source, target), covered)
+        self.assertLessEqual(plan.cost, plan.naive_cost)
+
+    def test_plan_states(self):
+        self.smc.move(StateOne)
+        self.smc.clear()
+        plan = self.smc.plan_states()
+        self.assertEqual(plan.steps[:2], [StateOne, StateMachineCrawler.EntryPoint])
+        self.assertEqual(set(plan.steps), set(self.smc._state_graph))
+        self.assertLessEqual(plan.cost, plan.naive_cost)
+
     def test_some(self):
         self.smc.verify_all_states(pattern=".*StateOne", full=True)
         visited_states = map(lambda item: item[0][0], self.target.visited.call_args_list)
@@ -198,11 +500,137 @@ class NegativeTestCases(unittest.TestCase):
         self.assertRaisesRegexp(TransitionError, "Move from state .+ to state .+ has failed",
                                 self.smc.move, InitialState)
 
+    def test_reenter_without_transition(self):
+        self.smc.move(StateTwo)
+        self.assertRaisesRegexp(TransitionError, "has failed: there is no transition to the target",
+                                self.smc.move, StateTwo)
+
     def test_not_all_reachable(self):
         self.target.last_verify.side_effect = Exception
         self.assertRaisesRegexp(TransitionError, "Failed to visit the following states: %s" % StateFour,
                                 self.smc.verify_all_states)
 
+    def test_full_coverage_after_failure(self):
+        self.target.reset.side_effect = Exception
+        self.assertRaisesRegexp(TransitionError, "Failed to visit the following states: .*%s" % StateOne,
+                                self.smc.verify_all_states, full=True)
+        self.assertEqual(self.target.reset.call_count, 1)
+        self.assertIn((StateOne, StateOne), self.smc._error_transitions)
+        self.assertIn(StateFour, self.smc._visited_states)
+        self.assertEqual(self.smc.plan_transitions().steps, [StateMachineCrawler.EntryPoint])
+
+    def test_transition_index(self):
+        self.assertEqual(self.smc._transition_map[StateTwo, StateThreeVariantOne].cost, 2)
+        self.assertEqual(self.smc._get_transition_cost(StateFour, StateMachineCrawler.EntryPoint), 0)
+        graph = self.smc.as_graph(True)
+        self.assertIn(StateMachineCrawler.EntryPoint.full_name, graph[StateFour.full_name]["transitions"])
+        self.assertNotIn(StateMachineCrawler.EntryPoint.full_name,
+                         self.smc.as_graph()[StateFour.full_name]["transitions"])
+
+    def test_path_table(self):
+        self.smc.use_path_table()
+        self.target.last_verify.side_effect = Exception
+        self.assertRaises(TransitionError, self.smc.move, StateFour)
+        self.assertRaises(UnreachableStateError, self.smc.move, StateFour)
+        self.smc.move(StateTwo)
+        self.smc.register_module(non_tpl_cases)
+        self.assertRaises(UnreachableStateError, self.smc.move, StateFour)
+        self.target.last_verify.side_effect = None
+        self.smc.clear()
+        self.smc.move(StateFour)
+        self.assertIs(self.smc.state, StateFour)
+        self.target.reset.side_effect = Exception
+        self.smc.move(StateOne)
+        self.assertRaises(TransitionError, self.smc.move, StateOne)
+        self.assertRaises(UnreachableStateError, self.smc.move, StateOne)
+        self.smc.use_path_table(False)
+        self.assertIs(self.smc._path_table, None)
+
+    def test_graph_model(self):
+        graph = self.smc.as_graph()
+        version = self.smc.graph_version
+        self.assertEqual(self.smc.as_graph(), graph)
+        self.assertEqual(self.smc.graph_version, version)
+
+        self.smc.move(StateOne)
+        self.assertFalse(graph[StateOne.full_name]["current"])
+        graph = self.smc.as_graph()
+        self.assertGreater(self.smc.graph_version, version)
+        self.assertTrue(graph[StateOne.full_name]["current"])
+        self.assertTrue(graph[StateOne.full_name]["visited"])
+        self.assertTrue(graph[InitialState.full_name]["transitions"][StateOne.full_name]["visited"])
+        self.assertFalse(graph[InitialState.full_name]["current"])
+
+        self.target.unique.side_effect = Exception
+        self.assertRaises(TransitionError, self.smc.move, StateTwo)
+        graph = self.smc.as_graph()
+        self.assertTrue(graph[StateTwo.full_name]["failed"])
+        self.assertTrue(graph[StateTwo.full_name]["transitions"][StateThreeVariantOne.full_name]["failed"])
+        self.assertTrue(self.smc.as_graph(True)[StateTwo.full_name]["failed"])
+
+        self.smc.clear()
+        graph = self.smc.as_graph()
+        self.assertFalse(graph[StateTwo.full_name]["failed"])
+        self.assertFalse(graph[StateOne.full_name]["visited"])
+
+        # the copies are the caller's own
+        for state in graph.itervalues():
+            state.pop("_entry")
+            state["transitions"].clear()
+        self.assertIn("_entry", self.smc.as_graph()[StateOne.full_name])
+        self.assertTrue(self.smc.as_graph()[InitialState.full_name]["transitions"])
+        version = self.smc.graph_version
+        self.target.unique.side_effect = None
+        self.smc.move(StateOne)
+        for state in self.smc.get_graph_changes(version)["states"]:
+            state.clear()
+        self.assertIn("_entry", self.smc.as_graph(True)[StateOne.full_name])
+
+        class Detached(State):
+
+            @transition(target_state=StateOne)
+            def attach(self):
+                pass
+
+        version = self.smc.graph_version
+        self.smc.register_state(Detached)
+        self.smc.register_module(non_tpl_cases)
+        self.assertIn(non_tpl_cases.TplStateTwo.full_name, self.smc.as_graph())
+        self.assertNotIn(Detached.full_name, self.smc.as_graph())
+        self.assertGreater(self.smc.graph_version, version)
+
+    def test_graph_changes(self):
+        version = self.smc.graph_version
+        self.assertEqual(self.smc.get_graph_changes(version), {"version": version, "states": [], "transitions": []})
+        self.assertIs(self.smc.get_graph_changes(version + 1), None)
+
+        self.smc.move(StateOne)
+        changes = self.smc.get_graph_changes(version)
+        self.assertEqual(changes["version"], self.smc.graph_version)
+        self.assertEqual(set(state["name"] for state in changes["states"]),
+                         {StateMachineCrawler.EntryPoint.full_name, InitialState.full_name, StateOne.full_name})
+        self.assertIn((InitialState.full_name, StateOne.full_name),
+                      [(item["source"], item["target"]) for item in changes["transitions"]])
+        self.assertEqual(self.smc.get_graph_changes(changes["version"])["states"], [])
+
+        with mock.patch.object(self.smc._graph_model, "_change_log", []):
+            self.assertIs(self.smc.get_graph_changes(version), None)
+
+        self.smc.register_module(non_tpl_cases)
+        self.assertIs(self.smc.get_graph_changes(changes["version"]), None)
+
+    def test_registration_after_failure(self):
+        self.target.last_verify.side_effect = Exception
+        self.assertRaises(TransitionError, self.smc.move, StateFour)
+        self.assertEqual(self.smc._error_states, {StateFour})
+        self.smc.register_module(non_tpl_cases)
+        self.smc.move(StateTwo)
+        self.assertRaises(UnreachableStateError, self.smc.move, StateFour)
+        self.target.enter.side_effect = Exception
+        self.smc.move(StateMachineCrawler.EntryPoint)
+        self.assertRaises(TransitionError, self.smc.move, StateTwo)
+        self.assertIn(non_tpl_cases.TplStateTwo, self.smc._error_states)
+
     def test_base_state_registration(self):
         self.smc.register_state(BaseState)
         self.assertFalse(BaseState in self.smc._registered_states)
@@ -228,6 +656,21 @@ class TestStateMachineDeclaration(unittest.TestCase):
             'tests.non_tpl_cases.TplStateTwo'
         ])
 
+    def test_batched_registration(self):
+        smc = StateMachineCrawler(mock.Mock(), InitialState)
+
+        with mock.patch.object(smc, "_reload_graphs", wraps=smc._reload_graphs) as reload_graphs:
+            with smc.registering():
+                with smc.registering():
+                    smc.register_module(non_tpl_cases)
+                for state in ALL_STATES:
+                    smc.register_state(state)
+                self.assertEqual(reload_graphs.call_count, 0)
+            self.assertEqual(reload_graphs.call_count, 1)
+
+        self.assertIn(StateFour, smc._state_graph)
+        self.assertIn(non_tpl_cases.TplStateTwo, smc._state_graph)
+
     def test_register_not_a_state(self):
 
         class NotAState:
@@ -0,0 +1,70 @@
+import unittest
+
+import mock
+
+from state_machine_crawler.serializers.svg import Serializer
+
+from .cases import StateOne
+from .utils import create_crawler
+
+
+# a trimmed output of: dot -Tsvg
+SVG_GRAPH = """<svg width="62pt" height="116pt" xmlns="http://www.w3.org/2000/svg">
+<g id="graph0" class="graph">
+<title>StateMachine</title>
+<g id="node1" class="node"><title>tests_cases_InitialState</title>
+<polygon fill="white" stroke="black" points="54,-36 0,-36 0,0 54,0 54,-36"/>
+<text text-anchor="middle" x="27" y="-13.8">InitialState</text>
+</g>
+<g id="node2" class="node"><title>state_machine_crawler_state_machine_crawler_EntryPoint</title>
+<ellipse fill="none" stroke="black" cx="27" cy="-90" rx="22" ry="22"/>
+<ellipse fill="forestgreen" stroke="black" cx="27" cy="-90" rx="18" ry="18"/>
+<text text-anchor="middle" x="27" y="-85.8" fill="white">+</text>
+</g>
+<g id="edge1" class="edge"><title>tests_cases_InitialState&#45;&gt;tests_cases_StateOne</title>
+<path fill="none" stroke="black" d="M27,-36C27,-44 27,-53 27,-62"/>
+<polygon fill="black" stroke="black" points="30.5,-62 27,-72 23.5,-62 30.5,-62"/>
+<text text-anchor="middle" x="28.5" y="-50.8"> </text>
+</g>
+</g>
+</svg>
+"""
+
+
+class SvgSerializerTest(unittest.TestCase):
+
+    def setUp(self):
+        Serializer._layouts.clear()
+        self.smc = create_crawler()
+
+    @mock.patch("pydot.graph_from_dot_data")
+    def test_restyle_cached_layout(self, graph_from_dot_data):
+        graph_from_dot_data.return_value.create_svg.return_value = SVG_GRAPH
+        self.assertEqual(repr(Serializer(self.smc)).count('fill="white"'), 2)
+
+        self.smc.move(StateOne)
+        svg = repr(Serializer(self.smc))
+        self.assertEqual(graph_from_dot_data.call_count, 1)
+        self.assertIn('<polygon fill="forestgreen" stroke="black" points="54,-36', svg)
+        self.assertIn('y="-13.8" fill="white">InitialState', svg)
+        self.assertIn('<ellipse fill="none" stroke="black"', svg)
+        self.assertIn('<path fill="none" stroke="forestgreen"', svg)
+        self.assertIn('<polygon fill="forestgreen" stroke="forestgreen"', svg)
+        self.assertIn('y="-50.8" fill="forestgreen"> </text>', svg)
+
+    @mock.patch("pydot.graph_from_dot_data")
+    def test_layout_per_structure(self, graph_from_dot_data):
+        graph_from_dot_data.return_value.create_svg.return_value = SVG_GRAPH
+        repr(Serializer(self.smc))
+        other = create_crawler(states=())
+        repr(Serializer(other))
+        repr(Serializer(self.smc))
+        self.assertEqual(graph_from_dot_data.call_count, 2)
+
+        Serializer._layouts.clear()
+        with mock.patch.object(Serializer, "LAYOUT_CACHE_SIZE", 1):
+            repr(Serializer(self.smc))
+            repr(Serializer(other))
+            repr(Serializer(self.smc))
+        self.assertEqual(graph_from_dot_data.call_count, 5)
+        self.assertEqual(len(Serializer._layouts), 1)
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from state_machine_crawler import Timings
+
+from .cases import StateOne, StateTwo, StateThreeVariantOne, StateThreeVariantTwo, StateFour
+from .utils import create_crawler
+
+
+class TimingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timings = Timings(size=20)
+
+    def test_stats(self):
+        for duration in range(1, 41):
+            self.timings.add_transition(StateOne, StateTwo, duration, 2)
+        stats = self.timings.get_transition(StateOne, StateTwo)
+        self.assertEqual(stats["count"], 40)
+        self.assertAlmostEqual(stats["mean"], 20.5)
+        self.assertEqual(stats["p95"], 39)
+        self.assertEqual(len(stats["samples"]), 20)
+        self.assertIs(self.timings.get_transition(StateTwo, StateOne), None)
+        self.assertIs(self.timings.get_verification(StateTwo), None)
+
+    def test_costs(self):
+        self.assertEqual(self.timings.get_cost(StateOne, StateTwo, 3), 3)
+        self.timings.add_transition(StateOne, StateTwo, 1.0, 2)
+        self.timings.add_verification(StateTwo, 3.0)
+        self.assertEqual(self.timings.get_cost(StateOne, StateTwo, 2), 4.0)
+        self.assertEqual(self.timings.get_cost(StateTwo, StateFour, 3), 6.0)
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "timings.json")
+            self.timings.add_transition(StateOne, StateTwo, 1.0, 2)
+            self.timings.add_verification(StateTwo, 3.0)
+            self.timings.save(path)
+            timings = Timings.load(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(timings.get_transition(StateOne, StateTwo), self.timings.get_transition(StateOne, StateTwo))
+        self.assertEqual(timings.get_verification(StateTwo), self.timings.get_verification(StateTwo))
+        self.assertEqual(timings.get_cost(StateTwo, StateFour, 3), 6.0)
+
+
+class MeasuredCostsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.smc = create_crawler()
+
+    def test_timings_are_collected(self):
+        self.smc.move(StateFour)
+        self.assertEqual(self.smc.timings.get_transition(StateTwo, StateThreeVariantTwo)["count"], 1)
+        self.assertEqual(self.smc.timings.get_verification(StateFour)["count"], 1)
+
+    def test_measured_costs_change_the_path(self):
+        self.smc.timings.add_transition(StateTwo, StateThreeVariantTwo, 10.0, 1)
+        self.smc.timings.add_transition(StateTwo, StateThreeVariantOne, 1.0, 2)
+        self.smc.move(StateTwo)
+        self.smc.move(StateFour)
+        self.assertIn((StateTwo, StateThreeVariantTwo), self.smc._visited_transitions)
+        self.smc.use_measured_costs()
+        self.smc.move(StateTwo)
+        self.smc.move(StateFour)
+        self.assertIn((StateTwo, StateThreeVariantOne), self.smc._visited_transitions)
@@ -1,3 +1,19 @@
+import mock
+
+from state_machine_crawler import StateMachineCrawler
+
+from .cases import ALL_STATES, InitialState
+
+
+def create_crawler(system=None, states=ALL_STATES):
+    """ Returns a crawler of the @system (a mock by default) with the @states registered """
+    smc = StateMachineCrawler(mock.Mock() if system is None else system, InitialState)
+    with smc.registering():
+        for state in states:
+            smc.register_state(state)
+    return smc
+
+
 def ser_list(tlist, level=0):
     rval = "[\n"
     for item in tlist:
@@ -0,0 +1,58 @@
+import unittest
+
+import mock
+
+from state_machine_crawler import StateMachineCrawler, FinalTarget, EveryNthHop, FirstVisit
+
+from .cases import ALL_STATES, StateTwo, StateFour
+from .utils import create_crawler
+
+
+class VerificationPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.target = mock.Mock()
+        self.smc = create_crawler(self.target)
+
+    def _verified(self):
+        return [item[0][0] for item in self.target.visited.call_args_list]
+
+    def test_final_target(self):
+        self.smc.verification_policy = FinalTarget()
+        self.smc.move(StateFour)
+        self.assertIs(self.smc.state, StateFour)
+        self.assertEqual(self._verified(), ["StateFour"])
+        self.assertNotIn(StateTwo, self.smc._visited_states)
+
+    def test_every_nth_hop(self):
+        self.smc.verification_policy = EveryNthHop(2)
+        self.smc.move(StateFour)
+        self.assertEqual(self._verified(), ["StateOne", "StateThreeVariantTwo", "StateFour"])
+
+    def test_first_visit(self):
+        self.smc.verification_policy = FirstVisit()
+        self.smc.move(StateTwo)
+        self.smc.move(StateMachineCrawler.EntryPoint)
+        self.smc.move(StateFour)
+        self.assertEqual(self._verified(), ["InitialState", "StateOne", "StateTwo", "StateThreeVariantTwo",
+                                            "StateFour"])
+
+    def test_all_states_are_verified(self):
+        self.smc.verification_policy = FinalTarget()
+        self.smc.move(StateFour)
+        self.smc.verify_all_states(full=True)
+        self.assertEqual(set(self._verified()), set(state.__name__ for state in ALL_STATES))
+        self.assertTrue(set(ALL_STATES).issubset(self.smc._visited_states))
+
+    def test_covered_transitions_are_verified(self):
+        self.smc.verify_all_states()
+        self.target.visited.reset_mock()
+        for policy in FinalTarget(), FirstVisit():
+            self.smc.verification_policy = policy
+            plan = self.smc.plan_transitions()
+            self.assertTrue(plan.checked_steps)
+            self.smc._follow(self.smc.plan_transitions)
+            self.assertEqual(len(self._verified()), len(plan.checked_steps))
+            self.smc._visited_transitions.clear()
+            self.smc.move(StateMachineCrawler.EntryPoint)
+            self.target.visited.reset_mock()
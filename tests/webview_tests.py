@@ -0,0 +1,120 @@
+import zlib
+import json
+import time
+import urllib2
+import threading
+import unittest
+
+import mock
+
+from state_machine_crawler import StateMachineCrawler, WebView
+
+from .cases import InitialState, StateOne
+from .utils import create_crawler
+
+
+class WebViewTest(unittest.TestCase):
+
+    def setUp(self):
+        self.smc = create_crawler()
+        self.viewer = WebView(self.smc, port=0)
+        self.viewer.start()
+
+    def tearDown(self):
+        self.viewer.stop()
+
+    def _get(self, path, **headers):
+        request = urllib2.Request("http://%s:%d%s" % (WebView.HOST, self.viewer.port, path), headers=headers)
+        return urllib2.urlopen(request, timeout=5)
+
+    def test_static_caching_and_compression(self):
+        resp = self._get("/jquery-2.1.3.min.js", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.info()["Content-Encoding"], "gzip")
+        self.assertIn("max-age", resp.info()["Cache-Control"])
+        self.assertIn("jQuery", zlib.decompress(resp.read(), 16 + zlib.MAX_WBITS))
+
+        try:
+            self._get("/jquery-2.1.3.min.js", **{"If-None-Match": resp.info()["ETag"]})
+        except urllib2.HTTPError, e:
+            self.assertEqual(e.code, 304)
+        else:
+            self.fail("The file is sent again")
+
+        resp = self._get("/")
+        self.assertNotIn("Content-Encoding", resp.info())
+        self.assertEqual(resp.info()["Cache-Control"], "no-cache")
+        self.assertIn("<html", resp.read())
+
+    def test_events(self):
+        version = int(self._get("/graph.txt").info()["X-Graph-Version"])
+        self.smc.move(StateOne)
+        changes = json.load(self._get("/events?version=%d" % version))
+        self.assertFalse(changes["reload"])
+        self.assertIn({"id": "tests_cases_StateOne", "color": "blue", "text_color": "white"}, changes["states"])
+        self.assertTrue(json.load(self._get("/events?version=0"))["reload"])
+
+    def test_json_graph(self):
+        self.smc.move(StateOne)
+        resp = self._get("/graph.json")
+        graph = json.load(resp)
+        self.assertEqual(graph["version"], self.smc.graph_version)
+        names = [state["name"] for state in graph["states"]]
+        self.assertEqual(len(names), len(self.smc.as_graph()))
+        transition = [item for item in graph["transitions"] if names[item["target"]] == StateOne.full_name][0]
+        self.assertEqual(names[transition["source"]], InitialState.full_name)
+        self.assertEqual(transition["color"], "forestgreen")
+        self.assertNotIn("_entry", graph["states"][0])
+
+        request = urllib2.Request(resp.geturl(), headers={"If-None-Match": resp.info()["ETag"]})
+        try:
+            urllib2.urlopen(request, timeout=5)
+        except urllib2.HTTPError, e:
+            self.assertEqual(e.code, 304)
+        else:
+            self.fail("The graph is sent again")
+
+        self.smc.move(StateMachineCrawler.EntryPoint)
+        self.assertEqual(urllib2.urlopen(request, timeout=5).code, 200)
+
+    def test_concurrent_renders_are_shared(self):
+        renders = []
+
+        class Serializer(object):
+            mimetype = "text/plain"
+
+            def __init__(self, scm):
+                renders.append(scm)
+                time.sleep(0.2)
+
+            def __repr__(self):
+                return "graph"
+
+        results = []
+        with mock.patch.dict(WebView.SERIALIZER_MAP, {"txt": mock.Mock(Serializer=Serializer)}):
+            # a slow long poll doesn't block the other requests
+            poll = threading.Thread(target=self._get, args=("/events?version=%d" % self.smc.graph_version,))
+            poll.start()
+            threads = [threading.Thread(target=lambda: results.append(self._get("/graph.txt").read()))
+                       for _ in xrange(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, ["graph"] * 4)
+            self.assertEqual(len(renders), 1)
+            self.assertTrue(poll.is_alive())
+
+        self.viewer.stop()
+        poll.join()
+        self.assertRaises(urllib2.URLError, self._get, "/graph.txt")
+
+    def test_unthreaded_events(self):
+        self.viewer.stop()
+        self.viewer = WebView(self.smc, port=0, threaded=False)
+        self.viewer.start()
+        started = time.time()
+        changes = json.load(self._get("/events?version=%d" % self.smc.graph_version))
+        self.assertLess(time.time() - started, WebView.EVENTS_TIMEOUT)
+        self.assertEqual(changes["states"], [])
+        self.assertEqual(changes["delay"], WebView.UNTHREADED_POLL_DELAY)
+        self.assertIn("<html", self._get("/").read())